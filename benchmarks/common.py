@@ -0,0 +1,75 @@
+import numpy as np
+
+import pylandstats as pls
+
+NODATA = 0
+RES = (30, 30)
+
+
+def make_landscape_arr(num_cells, num_classes, fragmentation=.05,
+                       nodata_frac=0, seed=0):
+    """
+    Generates a synthetic (square) landscape array
+
+    Parameters
+    ----------
+    num_cells : int
+        Approximate number of cells of the landscape
+    num_classes : int
+        Number of classes, whose values go from 1 to `num_classes`
+    fragmentation : float, default .05
+        Inverse of the side (in number of cells) of the square blocks to
+        which a random class is assigned, e.g., .05 results in blocks of 20x20
+        cells and 1 in a random class for each cell. Contiguous blocks of the
+        same class are merged into larger patches
+    nodata_frac : float, default 0
+        Fraction of the rows of the landscape (at its bottom) that are nodata
+    seed : int, default 0
+        Seed of the random number generator
+
+    Returns
+    -------
+    landscape_arr : np.ndarray
+    """
+    side = int(round(np.sqrt(num_cells)))
+    block_side = max(int(round(1 / fragmentation)), 1)
+    num_blocks = -(-side // block_side)
+
+    random_state = np.random.RandomState(seed)
+    dtype = np.min_scalar_type(num_classes)
+    blocks_arr = random_state.randint(1, num_classes + 1,
+                                      size=(num_blocks, num_blocks)).astype(
+                                          dtype)
+    landscape_arr = np.repeat(np.repeat(blocks_arr, block_side, axis=0),
+                              block_side, axis=1)[:side, :side]
+
+    num_nodata_rows = int(round(nodata_frac * side))
+    if num_nodata_rows > 0:
+        landscape_arr[side - num_nodata_rows:] = NODATA
+
+    return landscape_arr
+
+
+_landscape_arrs = {}
+
+
+def get_landscape_arr(*args, **kwargs):
+    # generating the largest landscapes takes a while, so keep them for the
+    # benchmarks of the same process
+    key = args + tuple(sorted(kwargs.items()))
+    try:
+        return _landscape_arrs[key]
+    except KeyError:
+        landscape_arr = make_landscape_arr(*args, **kwargs)
+        _landscape_arrs[key] = landscape_arr
+        return landscape_arr
+
+
+def make_landscape(*args, **kwargs):
+    """
+    Instantiates a `Landscape` from a synthetic landscape array (without
+    copying it), so that none of its cached structures has been computed. See
+    `make_landscape_arr` for the arguments
+    """
+    return pls.Landscape(get_landscape_arr(*args, **kwargs), res=RES,
+                         nodata=NODATA, copy=False)
@@ -0,0 +1,76 @@
+import pylandstats as pls
+
+from .common import make_landscape
+
+# sizes (number of cells) for the benchmarks of each metric, and for the
+# benchmarks of the data frame entry points
+METRIC_SIZES = [10**4, 10**6]
+DF_SIZES = [10**4, 10**6, 10**8]
+NUM_CLASSES = [2, 10, 50]
+FRAGMENTATIONS = [.01, .2]
+NODATA_FRACS = [0, .3]
+
+
+class MetricsBenchmark(object):
+    # each sample computes the metric on a new `Landscape` instance, so that
+    # the timings include the computation of the cached structures that the
+    # metric requires (e.g., the label array), i.e., what it costs to compute
+    # the metric on its own
+    number = 1
+    repeat = (1, 5, 30.)
+    timeout = 600
+
+    param_names = ['metric', 'num_cells']
+
+    def setup(self, metric, num_cells):
+        self.landscape = make_landscape(num_cells, 10)
+
+
+class PatchMetrics(MetricsBenchmark):
+    params = (pls.Landscape.PATCH_METRICS, METRIC_SIZES)
+
+    def time_metric(self, metric, num_cells):
+        getattr(self.landscape, metric)()
+
+
+class ClassMetrics(MetricsBenchmark):
+    params = (pls.Landscape.CLASS_METRICS, METRIC_SIZES)
+
+    def time_metric(self, metric, num_cells):
+        # as in `compute_class_metrics_df`, compute the metric for all the
+        # classes at once
+        getattr(self.landscape, metric)(self.landscape.classes)
+
+
+class LandscapeMetrics(MetricsBenchmark):
+    params = (pls.Landscape.LANDSCAPE_METRICS, METRIC_SIZES)
+
+    def time_metric(self, metric, num_cells):
+        getattr(self.landscape, metric)()
+
+
+class MetricsDataFrames(object):
+    # note that each sample on the largest landscapes can take several
+    # minutes
+    number = 1
+    repeat = (1, 5, 30.)
+    timeout = 3600
+
+    params = (DF_SIZES, NUM_CLASSES, FRAGMENTATIONS, NODATA_FRACS)
+    param_names = [
+        'num_cells', 'num_classes', 'fragmentation', 'nodata_frac'
+    ]
+
+    def setup(self, num_cells, num_classes, fragmentation, nodata_frac):
+        self.landscape = make_landscape(num_cells, num_classes,
+                                        fragmentation=fragmentation,
+                                        nodata_frac=nodata_frac)
+
+    def time_compute_patch_metrics_df(self, *args):
+        self.landscape.compute_patch_metrics_df()
+
+    def time_compute_class_metrics_df(self, *args):
+        self.landscape.compute_class_metrics_df()
+
+    def time_compute_landscape_metrics_df(self, *args):
+        self.landscape.compute_landscape_metrics_df()
@@ -0,0 +1,59 @@
+import numpy as np
+
+import pylandstats as pls
+
+from .common import make_landscape
+
+SIZES = [10**4, 10**6]
+
+
+class SpatioTemporalAnalysis(object):
+    number = 1
+    repeat = (1, 5, 30.)
+    timeout = 1800
+
+    params = (SIZES, [2, 10])
+    param_names = ['num_cells', 'num_dates']
+
+    def setup(self, num_cells, num_dates):
+        # a different synthetic landscape for each date
+        self.landscapes = [
+            make_landscape(num_cells, 10, seed=i) for i in range(num_dates)
+        ]
+
+    def time_class_metrics_df(self, *args):
+        pls.SpatioTemporalAnalysis(self.landscapes).class_metrics_df
+
+    def time_landscape_metrics_df(self, *args):
+        pls.SpatioTemporalAnalysis(self.landscapes).landscape_metrics_df
+
+
+class GradientAnalysis(object):
+    number = 1
+    repeat = (1, 5, 30.)
+    timeout = 1800
+
+    params = (SIZES + [2000**2], [4, 20])
+    param_names = ['num_cells', 'num_masks']
+
+    def setup(self, num_cells, num_masks):
+        self.landscape = make_landscape(num_cells, 10)
+        # concentric (i.e., nested) circular masks around the center of the
+        # landscape
+        num_rows, num_cols = self.landscape.landscape_arr.shape
+        rows, cols = np.ogrid[:num_rows, :num_cols]
+        dist_arr = np.hypot(rows - num_rows / 2, cols - num_cols / 2)
+        self.masks_arr = np.array([
+            dist_arr <= radius for radius in np.linspace(
+                0, min(num_rows, num_cols) / 2, num_masks + 1)[1:]
+        ])
+
+    def time_class_metrics_df(self, num_cells, num_masks):
+        pls.GradientAnalysis(self.landscape, self.masks_arr).class_metrics_df
+
+    def time_landscape_metrics_df(self, num_cells, num_masks):
+        pls.GradientAnalysis(self.landscape,
+                             self.masks_arr).landscape_metrics_df
+
+    def peakmem_class_metrics_df(self, num_cells, num_masks):
+        pls.GradientAnalysis(self.landscape, self.masks_arr).class_metrics_df
@@ -1,5 +1,9 @@
+from .cache import *
 from .gradient import *
 from .landscape import *
+from .lazy import *
+from .profiling import *
 from .spatiotemporal import *
+from .tiled import *
 
 __version__ = '0.4.1'
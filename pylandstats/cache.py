@@ -0,0 +1,182 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+__all__ = ['MetricsCache']
+
+_CACHE_FILE_EXT = '.pkl'
+
+
+def _canonicalize(obj):
+    # turn dicts (e.g., `metrics_kws`) and list-likes (e.g., `metrics`) into
+    # nested lists so that their representation does not depend on the order
+    # of the dict keys nor on the numpy print options
+    if isinstance(obj, dict):
+        return sorted(
+            (str(key), _canonicalize(value)) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, np.ndarray)):
+        return [_canonicalize(value) for value in obj]
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    else:
+        return obj
+
+
+def _compute_cache_key(*parts):
+    # key under which a result is stored in a `MetricsCache`, i.e., the
+    # digest of the objects that identify it (e.g., the content hash of the
+    # landscape, the name of the metric and its keyword arguments). The
+    # version of pylandstats is also part of the key, so that the results
+    # stored by other versions (whose metrics might be computed differently)
+    # are not reused. It is imported here to avoid a circular import
+    from . import __version__
+
+    return hashlib.sha1(
+        repr(_canonicalize((__version__, ) + parts)).encode(
+            'utf-8')).hexdigest()
+
+
+class MetricsCache(object):
+    """Persistent on-disk cache of the results (e.g., metrics and expensive
+    intermediate structures) computed for a landscape, with a size-bounded
+    least recently used (LRU) eviction policy
+    """
+
+    def __init__(self, cache_dir, max_size=2**30):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            Path to the directory where the results are stored. It is
+            created if it does not exist
+        max_size : int, default 2**30
+            Maximum size (in bytes) of the cache directory. When exceeded,
+            the least recently used results are evicted
+        """
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def __getstate__(self):
+        # the size estimate is not shared among processes
+        state = self.__dict__.copy()
+        state.pop('_size', None)
+        return state
+
+    def _get_filepath(self, key):
+        return os.path.join(self.cache_dir, key + _CACHE_FILE_EXT)
+
+    def _iter_entries(self):
+        # (last use time, size, path) of each stored result
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(_CACHE_FILE_EXT):
+                filepath = os.path.join(self.cache_dir, filename)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    # evicted by another process
+                    continue
+                yield stat.st_mtime, stat.st_size, filepath
+
+    @property
+    def size(self):
+        """Size (in bytes) of the stored results"""
+        return sum(size for _, size, _ in self._iter_entries())
+
+    def __len__(self):
+        return sum(1 for _ in self._iter_entries())
+
+    def __contains__(self, key):
+        return os.path.exists(self._get_filepath(key))
+
+    def __getitem__(self, key):
+        filepath = self._get_filepath(key)
+        try:
+            with open(filepath, 'rb') as f:
+                value = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            raise KeyError(key)
+
+        # mark the result as recently used (the modification time is used
+        # rather than the access time, which is not updated on file systems
+        # mounted with `noatime`)
+        try:
+            os.utime(filepath, None)
+        except OSError:
+            pass
+
+        return value
+
+    def __setitem__(self, key, value):
+        filepath = self._get_filepath(key)
+        # write to a temporary file first so that other processes never read
+        # a partially written result
+        fd, tmp_filepath = tempfile.mkstemp(dir=self.cache_dir,
+                                            suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            getattr(os, 'replace', os.rename)(tmp_filepath, filepath)
+        except BaseException:
+            os.remove(tmp_filepath)
+            raise
+
+        # keep a running estimate of the size of the cache so that the
+        # directory is only scanned again when the size limit is exceeded
+        try:
+            self._size += os.path.getsize(filepath)
+        except AttributeError:
+            self._size = self.size
+        if self._size > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        # remove the least recently used results until the cache fits within
+        # `max_size`
+        entries = sorted(self._iter_entries())
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, filepath in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def get_or_compute(self, key, compute):
+        """
+        Gets a result from the cache, computing (and storing) it on a miss
+
+        Parameters
+        ----------
+        key : str
+            Key of the result
+        compute : callable
+            Function (without arguments) that computes the result
+
+        Returns
+        -------
+        value : object
+            The (stored or computed) result
+        """
+        try:
+            return self[key]
+        except KeyError:
+            value = compute()
+            self[key] = value
+            return value
+
+    def clear(self):
+        """Removes all the stored results"""
+        for _, _, filepath in list(self._iter_entries()):
+            try:
+                os.remove(filepath)
+            except OSError:
+                pass
+        self._size = 0
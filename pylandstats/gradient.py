@@ -1,9 +1,16 @@
+import multiprocessing
+
 import numpy as np
+import pandas as pd
 import rasterio
 from rasterio import features
+from rasterio import windows
+from scipy import ndimage
 
 from .landscape import Landscape
-from .multilandscape import MultiLandscape
+from .multilandscape import MultiLandscape, _LazyLandscapes
+from .profiling import (_call_profiled, _get_worker_profile,
+                        _merge_worker_records)
 
 try:
     import geopandas as gpd
@@ -13,7 +20,290 @@ try:
 except ImportError:
     geo_imports = False
 
-__all__ = ['GradientAnalysis', 'BufferAnalysis']
+__all__ = ['GradientAnalysis', 'BufferAnalysis', 'MultiSiteBufferAnalysis']
+
+
+def _compute_mask_slice(mask_arr, row_off=0, col_off=0):
+    # slices of the bounding box of a mask (offset by `row_off` and
+    # `col_off`). Empty masks result in a single-cell bounding box
+    rows = np.flatnonzero(np.any(mask_arr, axis=1))
+    if rows.size == 0:
+        return slice(row_off, row_off + 1), slice(col_off, col_off + 1)
+    cols = np.flatnonzero(np.any(mask_arr, axis=0))
+    return (slice(row_off + rows[0], row_off + rows[-1] + 1),
+            slice(col_off + cols[0], col_off + cols[-1] + 1))
+
+
+def _get_mask_slice(masks_arr, i):
+    if isinstance(masks_arr, _BufferMasks):
+        return masks_arr.get_mask_slice(i)
+    else:
+        return _compute_mask_slice(masks_arr[i])
+
+
+def _get_mask(masks_arr, i, mask_slice):
+    if isinstance(masks_arr, _BufferMasks):
+        return masks_arr.get_mask(i, mask_slice)
+    else:
+        return np.asarray(masks_arr[i], dtype=bool)[mask_slice]
+
+
+def _get_utm_crs(longitude):
+    # trick from OSMnx to be able to buffer in meters
+    utm_zone = int(np.floor((longitude + 180) / 6.) + 1)
+    return {
+        'datum': 'WGS84',
+        'ellps': 'WGS84',
+        'proj': 'utm',
+        'zone': utm_zone,
+        'units': 'm'
+    }
+
+
+def _compute_longitudes(gser):
+    # longitudes of the centroids of the geometries of a GeoSeries. The
+    # centroids are computed in the crs of the GeoSeries and only they are
+    # reprojected. Since the centroid of a point is the point itself, points
+    # are reprojected directly (which also avoids the geopandas warning on
+    # centroids computed in a geographic crs)
+    if not np.all(gser.geom_type == 'Point'):
+        gser = gser.centroid
+    return gser.to_crs('EPSG:4326').x
+
+
+def _compute_window_slice(bounds, landscape_transform, landscape_shape):
+    # slices of the landscape window that covers `bounds`, i.e., a tuple of
+    # the form (min_x, min_y, max_x, max_y) in the landscape crs. The window
+    # is clipped to the landscape but always has at least one cell
+    num_rows, num_cols = landscape_shape
+    min_x, min_y, max_x, max_y = bounds
+    cols, rows = zip(*[
+        ~landscape_transform * (x, y) for x in (min_x, max_x)
+        for y in (min_y, max_y)
+    ])
+    row_start = int(np.clip(np.floor(min(rows)), 0, num_rows - 1))
+    row_end = int(np.clip(np.ceil(max(rows)), row_start + 1, num_rows))
+    col_start = int(np.clip(np.floor(min(cols)), 0, num_cols - 1))
+    col_end = int(np.clip(np.ceil(max(cols)), col_start + 1, num_cols))
+
+    return slice(row_start, row_end), slice(col_start, col_end)
+
+
+def _read_landscape_window(landscape, window_slice):
+    # read only the window of the landscape raster, and return it as a
+    # `Landscape` together with the transform of the window
+    with rasterio.open(landscape) as src:
+        window = windows.Window.from_slices(*window_slice)
+        # since the array is read from the raster, there is no need for
+        # `Landscape.__init__` to copy it again
+        return Landscape(src.read(1, window=window), res=src.res,
+                         nodata=src.nodata,
+                         copy=False), windows.transform(window, src.transform)
+
+
+def _compute_buffer_dist_arr(base_mask_geom, max_buffer_dist,
+                             landscape_transform, landscape_shape):
+    # distances from the cells of the window of the largest buffer to the
+    # base mask geometry, which must be in the landscape crs (note that the
+    # distances are in the units of such crs). Returns None if the base mask
+    # geometry does not intersect the landscape window
+    min_x, min_y, max_x, max_y = base_mask_geom.bounds
+    window_slice = _compute_window_slice(
+        (min_x - max_buffer_dist, min_y - max_buffer_dist,
+         max_x + max_buffer_dist, max_y + max_buffer_dist),
+        landscape_transform, landscape_shape)
+    rows, cols = window_slice
+    row_start, row_end = rows.start, rows.stop
+    col_start, col_end = cols.start, cols.stop
+    window_shape = (row_end - row_start, col_end - col_start)
+
+    if isinstance(base_mask_geom, Point):
+        # exact distances from the cell centers to the point
+        cols, rows = np.meshgrid(
+            np.arange(col_start, col_end) + .5,
+            np.arange(row_start, row_end) + .5)
+        xs, ys = landscape_transform * (cols, rows)
+        dist_arr = np.hypot(xs - base_mask_geom.x, ys - base_mask_geom.y)
+    else:
+        # rasterize the base mask once and compute the distances from each
+        # cell center to the closest cell of the base mask
+        window_transform = windows.transform(
+            windows.Window(col_start, row_start, window_shape[1],
+                           window_shape[0]), landscape_transform)
+        base_mask_arr = features.rasterize([base_mask_geom],
+                                           out_shape=window_shape,
+                                           transform=window_transform,
+                                           dtype=np.uint8)
+        if not np.any(base_mask_arr):
+            # the base mask might be thinner than a cell (e.g., a line)
+            base_mask_arr = features.rasterize(
+                [base_mask_geom], out_shape=window_shape,
+                transform=window_transform, all_touched=True, dtype=np.uint8)
+            if not np.any(base_mask_arr):
+                return None
+        dist_arr = ndimage.distance_transform_edt(
+            base_mask_arr == 0, sampling=(abs(landscape_transform.e),
+                                          abs(landscape_transform.a)))
+
+    return dist_arr, window_slice
+
+
+class _BufferMasks(object):
+    # sequence of the (landscape-sized) masks of buffers around a base mask,
+    # obtained as thresholds of a single raster of distances to the base
+    # mask (computed within the window of the largest buffer) rather than
+    # by rasterizing each buffer separately. Each mask is only generated when
+    # it is accessed
+    def __init__(self, dist_arr, window_slice, landscape_shape, buffer_dists,
+                 buffer_rings=False):
+        self._dist_arr = dist_arr
+        self._window_slice = window_slice
+        self._landscape_shape = landscape_shape
+        self._buffer_dists = buffer_dists
+        self._buffer_rings = buffer_rings
+
+    def __len__(self):
+        return len(self._buffer_dists)
+
+    def _get_window_mask(self, i):
+        if i < 0:
+            i += len(self)
+        mask_arr = self._dist_arr <= self._buffer_dists[i]
+        if self._buffer_rings and i > 0:
+            mask_arr &= self._dist_arr > self._buffer_dists[i - 1]
+        return mask_arr
+
+    def __getitem__(self, i):
+        mask_arr = np.zeros(self._landscape_shape, dtype=bool)
+        mask_arr[self._window_slice] = self._get_window_mask(i)
+        return mask_arr
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _get_window_relative_slice(self, mask_slice):
+        rows, cols = mask_slice
+        window_rows, window_cols = self._window_slice
+        return (slice(rows.start - window_rows.start,
+                      rows.stop - window_rows.start),
+                slice(cols.start - window_cols.start,
+                      cols.stop - window_cols.start))
+
+    def get_mask_slice(self, i):
+        window_rows, window_cols = self._window_slice
+        return _compute_mask_slice(self._get_window_mask(i),
+                                   window_rows.start, window_cols.start)
+
+    def get_mask(self, i, mask_slice):
+        # `mask_slice` must lie within the window
+        return self._get_window_mask(i)[self._get_window_relative_slice(
+            mask_slice)]
+
+
+class _MaskedLandscapes(_LazyLandscapes):
+    # sequence of the landscapes that result from masking a base landscape,
+    # each cropped to the bounding box of its mask so that the memory
+    # required scales with the masked area rather than with the size of the
+    # base landscape
+    def __init__(self, landscape, masks_arr):
+        super(_MaskedLandscapes, self).__init__(len(masks_arr))
+        self._landscape = landscape
+        self._masks_arr = masks_arr
+
+        # empty masks result in a landscape with a single nodata cell
+        self._mask_slices = [
+            _get_mask_slice(masks_arr, i) for i in range(len(masks_arr))
+        ]
+
+    def _get_landscape(self, i):
+        landscape = self._landscape
+        mask_slice = self._mask_slices[i]
+        # since `np.where` already returns a new array, there is no need for
+        # `Landscape.__init__` to copy it again
+        return Landscape(
+            np.where(_get_mask(self._masks_arr, i, mask_slice),
+                     landscape.landscape_arr[mask_slice], landscape.nodata),
+            res=(landscape.cell_width, landscape.cell_height),
+            nodata=landscape.nodata, copy=False,
+            n_threads=landscape.n_threads)
+
+    def _compute_mask_class_counts(self, i):
+        # count the cells of each class within the `i`-th mask from the
+        # compact class-index raster of the base landscape
+        landscape = self._landscape
+        mask_slice = self._mask_slices[i]
+        return np.bincount(
+            landscape._class_i_arr[mask_slice][_get_mask(
+                self._masks_arr, i, mask_slice)],
+            minlength=len(landscape.classes) + 1)
+
+    def get_mask_classes(self, i):
+        # classes present in the `i`-th landscape, without instantiating it
+        landscape = self._landscape
+        return landscape.classes[self._compute_mask_class_counts(i)[:-1] > 0]
+
+    @property
+    def classes(self):
+        landscape = self._landscape
+        class_counts = np.sum([
+            self._compute_mask_class_counts(i)
+            for i in range(self._num_landscapes)
+        ], axis=0)
+
+        return landscape.classes[class_counts[:-1] > 0]
+
+
+def _buffer_geoms(base_mask_geom, _buffer_dists, buffer_rings):
+    # buffer geometries around `base_mask_geom` (in its crs). For rings, the
+    # first distance of `_buffer_dists` must be zero
+    if buffer_rings:
+        return [
+            base_mask_geom.buffer(_buffer_dists[i + 1]) -
+            base_mask_geom.buffer(_buffer_dists[i])
+            for i in range(len(_buffer_dists) - 1)
+        ]
+    else:
+        return [
+            base_mask_geom.buffer(buffer_dist)
+            for buffer_dist in _buffer_dists
+        ]
+
+
+def _compute_buffer_masks_arr(base_mask_geom, _buffer_dists, buffer_rings,
+                              landscape_transform, landscape_shape,
+                              masks_geoms=None):
+    # get the mask of each buffer. If `masks_geoms` (the buffer geometries in
+    # the landscape crs) is provided, each mask is rasterized separately.
+    # Otherwise, the masks are thresholds of a single distance raster, so
+    # `base_mask_geom` must be in the (projected) landscape crs
+    if masks_geoms is None:
+        dist_window = _compute_buffer_dist_arr(base_mask_geom,
+                                               np.max(_buffer_dists),
+                                               landscape_transform,
+                                               landscape_shape)
+        if dist_window is not None:
+            # since the first distance of `_buffer_dists` is zero for rings,
+            # a ring's mask includes the cells at a distance in (r, R]
+            return _BufferMasks(
+                dist_window[0], dist_window[1], landscape_shape,
+                _buffer_dists[1:] if buffer_rings else _buffer_dists,
+                buffer_rings=buffer_rings)
+        # the base mask does not intersect the landscape, so we buffer it
+        # (in the landscape crs) and rasterize it as usual
+        masks_geoms = _buffer_geoms(base_mask_geom, _buffer_dists,
+                                    buffer_rings)
+
+    # rasterize each mask
+    num_rows, num_cols = landscape_shape
+    buffer_masks_arr = np.zeros((len(masks_geoms), num_rows, num_cols),
+                                dtype=np.uint8)
+    for i, mask_geom in enumerate(masks_geoms):
+        buffer_masks_arr[i] = features.rasterize(
+            [mask_geom], out_shape=landscape_shape,
+            transform=landscape_transform, dtype=np.uint8)
+
+    return buffer_masks_arr.astype(bool)
 
 
 class GradientAnalysis(MultiLandscape):
@@ -36,18 +326,18 @@ class GradientAnalysis(MultiLandscape):
             Name of the feature that will distinguish each landscape
         feature_values : str, optional
             Values of the feature that correspond to each of the landscapes
+        **kwargs : optional
+            Keyword arguments to be passed to `MultiLandscape.__init__`, i.e.,
+            `metrics`, `classes`, `metrics_kws`, `n_jobs`, `cache` and
+            `cache_policy`
         """
 
         if not isinstance(landscape, Landscape):
             landscape = Landscape(landscape)
 
-        landscapes = [
-            Landscape(
-                np.where(mask_arr, landscape.landscape_arr, landscape.nodata),
-                res=(landscape.cell_width,
-                     landscape.cell_height), nodata=landscape.nodata)
-            for mask_arr in masks_arr
-        ]
+        # the masked landscapes are only instantiated when they are first
+        # accessed, e.g., to compute their metrics
+        landscapes = _MaskedLandscapes(landscape, masks_arr)
 
         # TODO: is it useful to store `masks_arr` as instance attribute?
         self.masks_arr = masks_arr
@@ -71,15 +361,18 @@ class GradientAnalysis(MultiLandscape):
 class BufferAnalysis(GradientAnalysis):
     def __init__(self, landscape, base_mask, buffer_dists, buffer_rings=False,
                  base_mask_crs=None, landscape_crs=None,
-                 landscape_transform=None, metrics=None, classes=None,
-                 metrics_kws={}):
+                 landscape_transform=None, rasterize_buffers=True,
+                 metrics=None, classes=None, metrics_kws={}, n_jobs=None,
+                 cache=None, cache_policy=None):
         """
         Parameters
         ----------
         landscapes : list-like
             A list-like of `Landscape` objects or of strings/file objects/
             pathlib.Path objects so that each is passed as the `landscape`
-            argument of `Landscape.__init__`
+            argument of `Landscape.__init__`. In the latter case, only the
+            window of the raster that covers the largest buffer is read, and
+            the buffer masks are computed for such window
         base_mask : shapely geometry or geopandas GeoSeries
             Geometry that will serve as a base mask to buffer around
         buffer_dists : list-like
@@ -102,6 +395,16 @@ class BufferAnalysis(GradientAnalysis):
             system. Required if the passed-in landscapes are `Landscape`
             objects, ignored if they are paths to GeoTiff rasters that already
             contain such information.
+        rasterize_buffers : bool, default True
+            If True, each buffer is computed as a polygon (in the UTM zone of
+            the base mask) and rasterized separately. Otherwise, the buffer
+            masks are obtained as thresholds of a single raster of distances
+            from each cell center to the base mask, which is computed (in the
+            landscape crs, which must be projected) within the window of the
+            largest buffer only. Note that the buffers might then differ at
+            the cells of their boundary, since the distances are computed in
+            the landscape crs and, for base masks other than points, from the
+            rasterized base mask
         metrics : list-like, optional
             A list-like of strings with the names of the metrics that should
             be computed in the context of this analysis case
@@ -115,6 +418,20 @@ class BufferAnalysis(GradientAnalysis):
             string 'total_edge' (method name) to {'count_boundary': False}.
             The default empty dictionary will compute each metric according to
             FRAGSTATS defaults.
+        n_jobs : int, optional
+            Number of worker processes used to compute the metrics of the
+            landscapes in parallel. If -1, all the CPUs are used. If None or
+            1, the metrics are computed sequentially
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics data
+            frames of each landscape are stored, keyed by the content of the
+            landscape, so that they are not recomputed for identical
+            landscapes in later sessions. If None, nothing is stored on disk
+        cache_policy : {'all', 'summaries', 'none'}, optional
+            Which of the intermediate structures cached in memory by each
+            landscape are kept once its metrics data frame is computed (see
+            the `cache_policy` argument of `Landscape`). If None, the policy
+            of each landscape is used
         """
 
         # first check that we meet the package dependencies
@@ -169,19 +486,19 @@ class BufferAnalysis(GradientAnalysis):
                 landscape_shape = src.height, src.width
 
         # 3. buffer around base mask
-        avg_longitude = base_mask_gser.to_crs({
-            'init': 'epsg:4326'
-        }).unary_union.centroid.x
-        # trick from OSMnx to be able to buffer in meters
-        utm_zone = int(np.floor((avg_longitude + 180) / 6.) + 1)
-        utm_crs = {
-            'datum': 'WGS84',
-            'ellps': 'WGS84',
-            'proj': 'utm',
-            'zone': utm_zone,
-            'units': 'm'
-        }
-        base_mask_geom = base_mask_gser.to_crs(utm_crs).iloc[0]
+        if not rasterize_buffers:
+            if not rasterio.crs.CRS.from_user_input(
+                    landscape_crs).is_projected:
+                raise ValueError(
+                    "If `rasterize_buffers` is False, `landscape_crs` must "
+                    "be a projected crs")
+            buffer_crs = landscape_crs
+        else:
+            avg_longitude = _compute_longitudes(
+                gpd.GeoSeries([base_mask_gser.unary_union],
+                              crs=base_mask_gser.crs)).iloc[0]
+            buffer_crs = _get_utm_crs(avg_longitude)
+        base_mask_geom = base_mask_gser.to_crs(buffer_crs).iloc[0]
         if buffer_rings:
             if not isinstance(base_mask_geom, Point):
                 raise ValueError(
@@ -191,30 +508,466 @@ class BufferAnalysis(GradientAnalysis):
             buffer_dists = list(
                 map(lambda d: '{}-{}'.format(d[0], d[1]),
                     zip(_buffer_dists[:-1], _buffer_dists[1:])))
-            masks_gser = gpd.GeoSeries([
-                base_mask_geom.buffer(_buffer_dists[i + 1]) -
-                base_mask_geom.buffer(_buffer_dists[i])
-                for i in range(len(_buffer_dists) - 1)
-            ], index=buffer_dists, crs=utm_crs).to_crs(landscape_crs)
         else:
-            masks_gser = gpd.GeoSeries([
-                base_mask_geom.buffer(buffer_dist)
-                for buffer_dist in buffer_dists
-            ], index=buffer_dists, crs=utm_crs).to_crs(landscape_crs)
-
-        # 4. rasterize each mask
-        num_rows, num_cols = landscape_shape
-        buffer_masks_arr = np.zeros((len(buffer_dists), num_rows, num_cols),
-                                    dtype=np.uint8)
-        for i in range(len(masks_gser)):
-            buffer_masks_arr[i] = features.rasterize(
-                [masks_gser.iloc[i]], out_shape=landscape_shape,
-                transform=landscape_transform, dtype=np.uint8)
-
-        buffer_masks_arr = buffer_masks_arr.astype(bool)
+            _buffer_dists = buffer_dists
+
+        # 4. get the bounds of the largest buffer in the landscape crs
+        if rasterize_buffers:
+            masks_gser = gpd.GeoSeries(
+                _buffer_geoms(base_mask_geom, _buffer_dists, buffer_rings),
+                index=buffer_dists, crs=buffer_crs).to_crs(landscape_crs)
+            buffers_bounds = masks_gser.total_bounds
+        else:
+            max_buffer_dist = np.max(_buffer_dists)
+            min_x, min_y, max_x, max_y = base_mask_geom.bounds
+            buffers_bounds = (min_x - max_buffer_dist,
+                              min_y - max_buffer_dist,
+                              max_x + max_buffer_dist,
+                              max_y + max_buffer_dist)
+
+        # 5. if the landscape is a raster file, only read the window that
+        # covers the largest buffer (the masks will then be computed for the
+        # window)
+        if isinstance(landscape, Landscape):
+            self.landscape_window = None
+        else:
+            window_slice = _compute_window_slice(
+                buffers_bounds, landscape_transform, landscape_shape)
+            landscape, landscape_transform = _read_landscape_window(
+                landscape, window_slice)
+            landscape_shape = landscape.landscape_arr.shape
+            self.landscape_window = windows.Window.from_slices(*window_slice)
+
+        # 6. get the mask of each buffer
+        if rasterize_buffers:
+            buffer_masks_arr = _compute_buffer_masks_arr(
+                base_mask_geom, _buffer_dists, buffer_rings,
+                landscape_transform, landscape_shape, masks_geoms=masks_gser)
+        else:
+            # note that in this case, the buffer crs is the landscape crs
+            buffer_masks_arr = _compute_buffer_masks_arr(
+                base_mask_geom, _buffer_dists, buffer_rings,
+                landscape_transform, landscape_shape)
 
         # now we can call the parent's init with the landscape and the
         # constructed buffer_masks_arr
         super(BufferAnalysis, self).__init__(
             landscape, buffer_masks_arr, 'buffer_dists', buffer_dists,
-            metrics=metrics, classes=classes, metrics_kws=metrics_kws)
+            metrics=metrics, classes=classes, metrics_kws=metrics_kws,
+            n_jobs=n_jobs, cache=cache, cache_policy=cache_policy)
+
+
+# landscape (and its transform) of the `MultiSiteBufferAnalysis` instance,
+# set in each worker process of the pool by `_init_sites_worker`
+_worker_sites_landscape = None
+
+
+def _init_sites_worker(landscape, landscape_transform):
+    global _worker_sites_landscape
+    _worker_sites_landscape = landscape, landscape_transform
+
+
+def _compute_group_metrics_dfs(landscape, landscape_transform, group_args):
+    # compute the metrics data frames of a group of nearby sites, whose
+    # landscape window is read only once (or just sliced if `landscape` is a
+    # `Landscape` instance). Each site is then analyzed within its own
+    # sub-window
+    group_slice, sites_args, _buffer_dists, buffer_rings, ga_kws = group_args
+    if isinstance(landscape, Landscape):
+        group_landscape = Landscape(landscape.landscape_arr[group_slice],
+                                    res=(landscape.cell_width,
+                                         landscape.cell_height),
+                                    nodata=landscape.nodata, copy=False)
+        group_transform = windows.transform(
+            windows.Window.from_slices(*group_slice), landscape_transform)
+    else:
+        group_landscape, group_transform = _read_landscape_window(
+            landscape, group_slice)
+    group_arr = group_landscape.landscape_arr
+
+    metrics_dfs = []
+    for site, site_geom, masks_geoms, site_slice in sites_args:
+        site_arr = group_arr[site_slice]
+        masks_arr = _compute_buffer_masks_arr(
+            site_geom, _buffer_dists, buffer_rings,
+            windows.transform(windows.Window.from_slices(*site_slice),
+                              group_transform), site_arr.shape,
+            masks_geoms=masks_geoms)
+        ga = GradientAnalysis(
+            Landscape(site_arr, res=(group_landscape.cell_width,
+                                     group_landscape.cell_height),
+                      nodata=group_landscape.nodata, copy=False), masks_arr,
+            **ga_kws)
+        metrics_dfs.append((site, ga.class_metrics_df,
+                            ga.landscape_metrics_df))
+
+    return metrics_dfs
+
+
+def _compute_sites_group_metrics_dfs(args):
+    group_args, profile = args
+    return _call_profiled(profile, _compute_group_metrics_dfs,
+                          *(_worker_sites_landscape + (group_args, )))
+
+
+class MultiSiteBufferAnalysis(object):
+    def __init__(self, landscape, sites, buffer_dists, buffer_rings=False,
+                 sites_crs=None, landscape_crs=None, landscape_transform=None,
+                 rasterize_buffers=True, group_size=1024, metrics=None,
+                 classes=None, metrics_kws={}, n_jobs=None, cache=None):
+        """
+        Parameters
+        ----------
+        landscape : `Landscape` or str, file object or pathlib.Path object
+            A `Landscape` object or a string/file object/pathlib.Path object
+            with the path to a GeoTiff raster. In the latter case, each group
+            of nearby sites only reads the window of the raster that covers
+            their largest buffers
+        sites : geopandas GeoSeries
+            Geometries of the sites to buffer around. The index of the
+            GeoSeries is used to label the sites in the metrics data frames
+        buffer_dists : list-like
+            Buffer distances
+        buffer_rings : bool, default False
+            If `False`, each buffer zone will consist of the whole region that
+            lies within the respective buffer distance around the site. If
+            `True`, buffer zones will take the form of rings around the site.
+        sites_crs : dict, optional
+            The coordinate reference system of the sites. Required if `sites`
+            is a naive geopandas GeoSeries (with no crs set)
+        landscape_crs : dict, optional
+            The coordinate reference system of the landscape. Required if
+            `landscape` is a `Landscape` object, ignored if it is the path to
+            a GeoTiff raster that already contains such information.
+        landscape_transform : affine.Affine
+            Transformation from pixel coordinates to coordinate reference
+            system. Required if `landscape` is a `Landscape` object, ignored
+            if it is the path to a GeoTiff raster that already contains such
+            information.
+        rasterize_buffers : bool, default True
+            Whether the buffers of each site are rasterized separately, or
+            obtained as thresholds of a single distance raster. See the
+            documentation of `BufferAnalysis`
+        group_size : int, default 1024
+            Size (in number of cells) of the side of the square tiles that
+            are used to group nearby sites. The sites of each group share a
+            single read of the landscape window that covers their buffers
+        metrics : list-like, optional
+            A list-like of strings with the names of the metrics that should
+            be computed in the context of this analysis case
+        classes : list-like, optional
+            A list-like of ints or strings with the class values that should
+            be considered in the context of this analysis case. Since the
+            classes of each site are only known once its window has been
+            read, classes that are not present around any site are ignored
+        metrics_kws : dict, optional
+            Dictionary mapping the keyword arguments (values) that should be
+            passed to each metric method (key), e.g., to exclude the boundary
+            from the computation of `total_edge`, metric_kws should map the
+            string 'total_edge' (method name) to {'count_boundary': False}.
+            The default empty dictionary will compute each metric according to
+            FRAGSTATS defaults.
+        n_jobs : int, optional
+            Number of worker processes used to compute the metrics of the
+            groups of sites in parallel. If -1, all the CPUs are used. If None
+            or 1, the metrics are computed sequentially
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics data
+            frames of the buffers of each site are stored, keyed by the
+            content of the masked landscapes, so that they are not recomputed
+            in later sessions. If None, nothing is stored on disk
+        """
+
+        # first check that we meet the package dependencies
+        if not geo_imports:
+            raise ImportError(
+                "The `MultiSiteBufferAnalysis` class requires the geopandas "
+                "package. See https://github.com/geopandas/geopandas for more "
+                "information about installing geopandas")
+
+        if sites.crs is None:
+            if sites_crs is None:
+                raise ValueError(
+                    "If `sites` is a naive geopandas GeoSeries (with no crs "
+                    "set), `sites_crs` must be provided")
+            sites = sites.copy()  # avoid alias/ref problems
+            sites.crs = sites_crs
+        sites_crs = sites.crs
+
+        if metrics is not None:
+            implemented_metrics = np.union1d(Landscape.CLASS_METRICS,
+                                             Landscape.LANDSCAPE_METRICS)
+            inexistent_metrics = np.setdiff1d(metrics, implemented_metrics)
+            if inexistent_metrics.size > 0:
+                raise ValueError(
+                    "The metrics {} are not among the implemented metrics ".
+                    format(inexistent_metrics) +
+                    "(that is {})".format(implemented_metrics))
+
+        # get the crs, transform and shape of the landscape
+        if isinstance(landscape, Landscape):
+            if landscape_crs is None:
+                raise ValueError(
+                    "If passing a `Landscape` object (instead of a geotiff "
+                    "filepath), `landscape_crs` must be provided")
+            if landscape_transform is None:
+                raise ValueError(
+                    "If passing a `Landscape` object (instead of a geotiff "
+                    "filepath), `landscape_transform` must be provided")
+            landscape_shape = landscape.landscape_arr.shape
+        else:
+            with rasterio.open(landscape) as src:
+                landscape_crs = src.crs
+                landscape_transform = src.transform
+                landscape_shape = src.height, src.width
+
+        if buffer_rings:
+            if not np.all(sites.geom_type == 'Point'):
+                raise ValueError(
+                    "Buffer rings can only work when the sites are `Point` "
+                    "geometries")
+            _buffer_dists = np.concatenate([[0], buffer_dists])
+            buffer_dists = list(
+                map(lambda d: '{}-{}'.format(d[0], d[1]),
+                    zip(_buffer_dists[:-1], _buffer_dists[1:])))
+        else:
+            _buffer_dists = buffer_dists
+
+        # get the buffer geometries of all the sites at once (rather than
+        # site by site, which would reproject each of them separately), and
+        # the bounds of the largest buffer of each site in the landscape crs
+        if rasterize_buffers:
+            # as in `BufferAnalysis`, buffer in the UTM zone of each site
+            longitudes = _compute_longitudes(sites)
+            utm_zones = np.floor((longitudes + 180) / 6.).astype(int)
+            masks_gsers = []
+            for utm_zone in np.unique(utm_zones):
+                zone_longitudes = longitudes[utm_zones == utm_zone]
+                zone_sites = sites[utm_zones == utm_zone].to_crs(
+                    _get_utm_crs(zone_longitudes.iloc[0]))
+                buffers = [
+                    zone_sites.buffer(buffer_dist)
+                    for buffer_dist in _buffer_dists
+                ]
+                if buffer_rings:
+                    buffers = [
+                        buffers[i + 1].difference(buffers[i])
+                        for i in range(len(buffers) - 1)
+                    ]
+                masks_gsers.append(
+                    pd.concat(buffers, keys=range(len(buffers))).to_crs(
+                        landscape_crs))
+            masks_gser = pd.concat(masks_gsers)
+            sites_bounds = masks_gser.bounds.groupby(level=1).agg({
+                'minx': 'min',
+                'miny': 'min',
+                'maxx': 'max',
+                'maxy': 'max'
+            }).loc[sites.index]
+            sites_masks_geoms = {
+                site: list(site_masks_gser)
+                for site, site_masks_gser in masks_gser.groupby(level=1)
+            }
+            sites_geoms = dict.fromkeys(sites.index)
+        else:
+            if not rasterio.crs.CRS.from_user_input(
+                    landscape_crs).is_projected:
+                raise ValueError(
+                    "If `rasterize_buffers` is False, `landscape_crs` must "
+                    "be a projected crs")
+            max_buffer_dist = np.max(_buffer_dists)
+            sites = sites.to_crs(landscape_crs)
+            sites_bounds = sites.bounds
+            sites_bounds[['minx', 'miny']] -= max_buffer_dist
+            sites_bounds[['maxx', 'maxy']] += max_buffer_dist
+            sites_masks_geoms = dict.fromkeys(sites.index)
+            sites_geoms = sites
+
+        # sites whose buffers do not intersect the landscape are ignored
+        west, south, east, north = rasterio.transform.array_bounds(
+            landscape_shape[0], landscape_shape[1], landscape_transform)
+        sites_bounds = sites_bounds[(sites_bounds['minx'] < east)
+                                    & (sites_bounds['maxx'] > west) &
+                                    (sites_bounds['miny'] < north) &
+                                    (sites_bounds['maxy'] > south)]
+        if len(sites_bounds) == 0:
+            raise ValueError(
+                "The buffers of the sites do not intersect the landscape")
+
+        # group the sites by the tile of `group_size` cells where their
+        # window starts, and get the window of each group
+        sites_slices = [
+            _compute_window_slice(bounds, landscape_transform,
+                                  landscape_shape)
+            for bounds in sites_bounds.itertuples(index=False)
+        ]
+        groups = {}
+        for site, (rows, cols) in zip(sites_bounds.index, sites_slices):
+            groups.setdefault(
+                (rows.start // group_size, cols.start // group_size),
+                []).append((site, rows, cols))
+
+        ga_kws = dict(feature_name='buffer_dists',
+                      feature_values=buffer_dists, metrics=metrics,
+                      metrics_kws=metrics_kws, cache=cache)
+        self._groups_args = []
+        for group_sites in groups.values():
+            row_start = min(rows.start for _, rows, _ in group_sites)
+            col_start = min(cols.start for _, _, cols in group_sites)
+            self._groups_args.append(
+                ((slice(row_start,
+                        max(rows.stop for _, rows, _ in group_sites)),
+                  slice(col_start,
+                        max(cols.stop for _, _, cols in group_sites))), [
+                            (site, sites_geoms[site], sites_masks_geoms[site],
+                             (slice(rows.start - row_start,
+                                    rows.stop - row_start),
+                              slice(cols.start - col_start,
+                                    cols.stop - col_start)))
+                            for site, rows, cols in group_sites
+                        ], _buffer_dists, buffer_rings, ga_kws))
+
+        self._landscape = landscape
+        self._landscape_transform = landscape_transform
+
+        self.sites = sites.index
+        self.buffer_dists = buffer_dists
+        self.classes = classes
+        self.n_jobs = n_jobs
+
+    def __len__(self):
+        return len(self.sites)
+
+    def _compute_metrics_dfs(self):
+        # compute the metrics data frames of each group of sites, either
+        # sequentially or in a pool of processes
+        if self.n_jobs is None or self.n_jobs == 1 or len(
+                self._groups_args) < 2:
+            groups_metrics_dfs = [
+                _compute_group_metrics_dfs(self._landscape,
+                                           self._landscape_transform,
+                                           group_args)
+                for group_args in self._groups_args
+            ]
+        else:
+            if self.n_jobs < 0:
+                n_jobs = max(multiprocessing.cpu_count() + 1 + self.n_jobs,
+                             1)
+            else:
+                n_jobs = self.n_jobs
+            pool = multiprocessing.Pool(
+                min(n_jobs, len(self._groups_args)),
+                initializer=_init_sites_worker,
+                initargs=(self._landscape, self._landscape_transform))
+            try:
+                # if profiling, each worker returns its records along with
+                # the data frames
+                profile = _get_worker_profile()
+                results = pool.map(_compute_sites_group_metrics_dfs,
+                                   [(group_args, profile)
+                                    for group_args in self._groups_args])
+                groups_metrics_dfs = []
+                for group_metrics_dfs, records in results:
+                    groups_metrics_dfs.append(group_metrics_dfs)
+                    if records is not None:
+                        _merge_worker_records(records)
+            finally:
+                pool.close()
+                pool.join()
+
+        class_metrics_dfs = {}
+        landscape_metrics_dfs = {}
+        for group_metrics_dfs in groups_metrics_dfs:
+            for site, class_metrics_df, landscape_metrics_df in \
+                    group_metrics_dfs:
+                class_metrics_dfs[site] = class_metrics_df
+                landscape_metrics_dfs[site] = landscape_metrics_df
+        # keep the order of the sites
+        sites = [site for site in self.sites if site in class_metrics_dfs]
+
+        # the class metrics are indexed by class, site and buffer distance
+        # (i.e., as in `MultiLandscape`, the class goes first)
+        class_metrics_df = pd.concat(
+            [class_metrics_dfs[site] for site in sites], keys=sites,
+            names=['site']).reorder_levels(['class_val', 'site',
+                                            'buffer_dists'])
+        classes = class_metrics_df.index.get_level_values('class_val')
+        if self.classes is None:
+            class_order = np.unique(classes)
+        else:
+            class_order = np.intersect1d(self.classes, classes)
+        class_metrics_df = pd.concat([
+            class_metrics_df.loc[[class_val]] for class_val in class_order
+        ])
+
+        # the landscape metrics are indexed by site and buffer distance, and
+        # the sites whose buffers do not intersect the landscape are NaN
+        landscape_metrics_df = pd.concat(
+            [landscape_metrics_dfs[site] for site in sites], keys=sites,
+            names=['site']).reindex(
+                pd.MultiIndex.from_product([self.sites, self.buffer_dists],
+                                           names=['site', 'buffer_dists']))
+
+        self._class_metrics_df = class_metrics_df
+        self._landscape_metrics_df = landscape_metrics_df
+
+    @property
+    def class_metrics_df(self):
+        # both the class and landscape metrics are computed at once so that
+        # the buffer masks of each site are only obtained once
+        try:
+            return self._class_metrics_df
+        except AttributeError:
+            self._compute_metrics_dfs()
+            return self._class_metrics_df
+
+    @property
+    def landscape_metrics_df(self):
+        try:
+            return self._landscape_metrics_df
+        except AttributeError:
+            self._compute_metrics_dfs()
+            return self._landscape_metrics_df
+
+    def compute_tidy_metrics_df(self, level='landscape'):
+        """
+        Returns the metrics in long format ("tidy"), i.e., a data frame
+        indexed by site and buffer distance (and class if `level` is 'class')
+        with a row for each metric. Unlike in `class_metrics_df` (where the
+        class goes first, as in `MultiLandscape`), the rows are sorted by
+        site (in the order of `sites`), buffer distance, class and metric
+
+        Parameters
+        ----------
+        level : {'landscape', 'class'}, default 'landscape'
+            Whether to return the landscape-level metrics (from
+            `landscape_metrics_df`) or the class-level metrics (from
+            `class_metrics_df`)
+
+        Returns
+        -------
+        df : pd.DataFrame
+            Dataframe indexed by 'site' and 'buffer_dists' (followed by
+            'class_val' for class-level metrics), with the 'metric' and
+            'value' columns
+        """
+
+        if level == 'landscape':
+            metrics_df = self.landscape_metrics_df
+        elif level == 'class':
+            metrics_df = self.class_metrics_df.reorder_levels(
+                ['site', 'buffer_dists', 'class_val'])
+            # since the rows of `class_metrics_df` are sorted by class, a
+            # stable sort by site and buffer distance keeps the order of the
+            # classes within each buffer
+            metrics_df = metrics_df.iloc[np.lexsort(
+                (pd.Index(self.buffer_dists).get_indexer(
+                    metrics_df.index.get_level_values('buffer_dists')),
+                 pd.Index(self.sites).get_indexer(
+                     metrics_df.index.get_level_values('site'))))]
+        else:
+            raise ValueError(
+                "`level` must be either 'landscape' or 'class'")
+
+        return metrics_df.rename_axis(columns='metric').stack(
+            dropna=False).rename('value').reset_index(level='metric')
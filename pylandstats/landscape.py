@@ -1,31 +1,132 @@
 from __future__ import division
 
+import hashlib
+import multiprocessing
+import os
+import threading
 from functools import partial
-from itertools import combinations_with_replacement
+from multiprocessing.pool import ThreadPool
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import rasterio
+import scipy
+from rasterio import enums, windows
 from scipy import ndimage, spatial, stats
 
+from .cache import MetricsCache, _compute_cache_key
+from .profiling import (_add_disk_lookup, _get_cached_attr, _get_nbytes,
+                        _instrument)
+
 __all__ = ['Landscape']
 
 KERNEL_HORIZONTAL = np.array([[0, 0, 0], [1, 1, 1], [0, 0, 0]], dtype=np.int8)
 KERNEL_VERTICAL = np.array([[0, 1, 0], [0, 1, 0], [0, 1, 0]], dtype=np.int8)
-KERNEL_ABOVE = np.array([[0, 0, 0], [0, 1, 0], [0, 1, 0]], dtype=np.int8)
-KERNEL_BELOW = np.array([[0, 1, 0], [0, 1, 0], [0, 0, 0]], dtype=np.int8)
-KERNEL_LEFT = np.array([[0, 0, 0], [0, 1, 1], [0, 0, 0]], dtype=np.int8)
-KERNEL_RIGHT = np.array([[0, 0, 0], [1, 1, 0], [0, 0, 0]], dtype=np.int8)
 KERNEL_MOORE = ndimage.generate_binary_structure(2, 2)
 
+# the `n_jobs` keyword argument of `cKDTree.query` was renamed to `workers` in
+# scipy 1.6.0
+if tuple(map(int, scipy.__version__.split('.')[:2])) >= (1, 6):
+    KDTREE_WORKERS_KW = 'workers'
+else:
+    KDTREE_WORKERS_KW = 'n_jobs'
+
+# maximum range of the values of an integer raster for its classes to be
+# discovered with `np.bincount`
+MAX_BINCOUNT_RANGE = 2**20
+
+
+def _memmap_band(src):
+    # memory-map the first band of an uncompressed GeoTIFF whose strips are
+    # stored contiguously on a local file, otherwise return None
+    if src.driver != 'GTiff' or src.compression is not None:
+        return None
+    if src.count > 1 and src.interleaving != enums.Interleaving.band:
+        return None
+    if src.block_shapes[0][1] != src.width or not os.path.isfile(src.name):
+        return None
+
+    num_rows, num_cols = src.height, src.width
+    strip_rows = src.block_shapes[0][0]
+    try:
+        offsets = [
+            int(src.get_tag_item('BLOCK_OFFSET_0_{}'.format(i), 'TIFF',
+                                 bidx=1))
+            for i in range(-(-num_rows // strip_rows))
+        ]
+    except (TypeError, ValueError):
+        return None
+    with open(src.name, 'rb') as f:
+        byte_order = {b'II': '<', b'MM': '>'}.get(f.read(2))
+    if byte_order is None:
+        return None
+    dtype = np.dtype(src.dtypes[0]).newbyteorder(byte_order)
+    strip_size = strip_rows * num_cols * dtype.itemsize
+    if np.any(np.diff(offsets) != strip_size):
+        return None
+
+    landscape_arr = np.memmap(src.name, dtype=dtype, mode='r',
+                              offset=offsets[0], shape=(num_rows, num_cols))
+    # make sure that the memory-mapped array matches what GDAL reads
+    for row in [0, num_rows - 1]:
+        if not np.array_equal(
+                landscape_arr[row],
+                src.read(1, window=windows.Window(0, row, num_cols,
+                                                  1))[0]):
+            return None
+
+    return landscape_arr
+
+
+def _compute_classes(landscape_arr, nodata):
+    # get the classes of the landscape, the number of cells of each class and
+    # the number of cells that are not nodata. NaN cells are treated as
+    # nodata (even if `nodata` is another value), as in the computation of
+    # the edges and adjacencies, where they get the nodata class index (see
+    # `Landscape._compute_class_i_arr`). Integer rasters whose
+    # values span a bounded range are histogrammed by blocks of rows with
+    # `np.bincount`, which (unlike `np.unique`) does not sort nor copy the
+    # whole raster
+    if np.issubdtype(landscape_arr.dtype, np.integer) and np.can_cast(
+            landscape_arr.dtype, np.intp) and landscape_arr.size > 0:
+        arr_min, arr_max = int(landscape_arr.min()), int(landscape_arr.max())
+    else:
+        arr_min, arr_max = 0, np.inf
+    if arr_max - arr_min < MAX_BINCOUNT_RANGE:
+        counts = np.zeros(arr_max - arr_min + 1, dtype=np.int64)
+        arr = landscape_arr.reshape(len(landscape_arr), -1)
+        num_block_rows = max(2**22 // max(arr.shape[1], 1), 1)
+        for i in range(0, len(arr), num_block_rows):
+            block_arr = arr[i:i + num_block_rows].ravel()
+            if arr_min != 0:
+                block_arr = block_arr.astype(np.intp) - arr_min
+            counts += np.bincount(block_arr, minlength=len(counts))
+        values = np.flatnonzero(counts)
+        counts = counts[values]
+        # by default, numpy creates arrays of floats. Instead, land use/land
+        # cover rasters are often of integer dtypes. Therefore, we will
+        # explicitly set the dtype of the landscape classes to ensure
+        # consistency
+        values = (values + arr_min).astype(landscape_arr.dtype)
+    else:
+        # floating point (or unbounded) rasters
+        values, counts = np.unique(landscape_arr, return_counts=True)
+
+    class_cond = (values != nodata) & ~np.isnan(values)
+    class_counts = counts[class_cond]
+
+    return values[class_cond], class_counts, np.sum(class_counts)
 
+
+@_instrument
 class Landscape:
     """Class representing a raster landscape upon which the landscape metrics
     will be computed
     """
 
-    def __init__(self, landscape, res=None, nodata=None, **kwargs):
+    def __init__(self, landscape, res=None, nodata=None, copy=True,
+                 cache=None, cache_policy='all', n_threads=None, **kwargs):
         """
         Parameters
         ----------
@@ -39,13 +140,54 @@ class Landscape:
             `np.ndarray`
         nodata : int, optional
             Value to be assigned to pixels with no data. It will be set to 0
-            if `landscape` is a `np.ndarray`
+            if `landscape` is a `np.ndarray`. Pixels with NaN values are also
+            treated as nodata
+        copy : bool, default True
+            Whether the landscape array should be copied. If False and
+            `landscape` is a `np.ndarray` (e.g., a `np.memmap` or an array
+            loaded with `np.load(..., mmap_mode='r')`), the instance will keep
+            a read-only view of it, so that its buffer can be shared among
+            several instances without being copied. If False and `landscape`
+            is an uncompressed GeoTIFF file whose strips are stored
+            contiguously, the raster will be memory-mapped (otherwise it will
+            be read into memory). In any case, the landscape array is never
+            modified
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics and the
+            expensive intermediate structures (e.g., the label array and the
+            adjacency table) are stored, keyed by the content of the
+            landscape, so that they are not recomputed for identical
+            landscapes in later sessions. If None, nothing is stored on disk
+        cache_policy : {'all', 'summaries', 'none'}, default 'all'
+            Which of the intermediate structures cached in memory (see
+            `cache_sizes`) are kept after computing a metrics data frame,
+            i.e., all of them, only the per-class summaries (e.g., the number
+            of patches of each class and the adjacency table) while dropping
+            the per-cell and per-patch structures (e.g., the label array and
+            the patch areas), or none of them
+        n_threads : int, optional
+            Number of threads used to compute the per-class primitives
+            concurrently, i.e., the labeling of the patches of each class and
+            the nearest neighbor queries among the boundary cells of each
+            class, whose heavy lifting is done by scipy code that releases the
+            GIL. If -1, all the CPUs are used. If None or 1, the classes are
+            processed sequentially (but the nearest neighbor queries of each
+            class use all the CPUs). In any case, the results do not depend on
+            the number of threads
         **kwargs : optional
             Keyword arguments to be passed to `rasterio.open`. Ignored if
             `landscape` is an `np.ndarray`
         """
+        if cache_policy not in self._CACHE_POLICIES:
+            raise ValueError("`cache_policy` must be among {}".format(
+                self._CACHE_POLICIES))
+
         if isinstance(landscape, np.ndarray):
-            landscape_arr = np.copy(landscape)
+            if copy:
+                landscape_arr = np.copy(landscape)
+            else:
+                landscape_arr = landscape.view()
+                landscape_arr.flags.writeable = False
             if res is None:
                 raise ValueError(
                     "If `landscape` is a `np.ndarray`, `res` must be provided")
@@ -53,7 +195,9 @@ class Landscape:
                 nodata = 0
         else:
             with rasterio.open(landscape, nodata=nodata, **kwargs) as src:
-                landscape_arr = src.read(1)
+                landscape_arr = None if copy else _memmap_band(src)
+                if landscape_arr is None:
+                    landscape_arr = src.read(1)
                 if res is None:
                     res = src.res
                 if nodata is None:
@@ -63,15 +207,26 @@ class Landscape:
         self.cell_width, self.cell_height = res
         self.cell_area = res[0] * res[1]
         self.nodata = nodata
-        # by default, numpy creates arrays of floats. Instead, land use/land
-        # cover rasters are often of integer dtypes. Therefore, we will
-        # explicitly set the dtype of the landscape classes to ensure
-        # consistency
-        classes = np.array(
-            sorted(np.unique(landscape_arr)), dtype=self.landscape_arr.dtype)
-        classes = classes[classes != nodata]
-        classes = classes[~np.isnan(classes)]
-        self.classes = classes
+        self.classes, class_num_cells, num_cells = _compute_classes(
+            landscape_arr, nodata)
+        # keep the cell counts so that the class and landscape areas do not
+        # require other passes over the landscape array
+        self._cached_class_num_cells_ser = pd.Series(
+            class_num_cells, index=self.classes, name='num_cells')
+        self._landscape_area = num_cells * self.cell_area
+
+        if cache is not None and not isinstance(cache, MetricsCache):
+            cache = MetricsCache(cache)
+        self.metrics_cache = cache
+        self.cache_policy = cache_policy
+        self.n_threads = n_threads
+
+    # on-disk cache (see `MetricsCache`), in-memory cache policy and number of
+    # threads, also for children classes that do not call
+    # `Landscape.__init__`
+    metrics_cache = None
+    cache_policy = 'all'
+    n_threads = None
 
     ###########################################################################
     # common utilities
@@ -120,10 +275,58 @@ class Landscape:
                   for suffix in _suffixes
               ] + ['contagion', 'shannon_diversity_index']
 
+    # intermediate structures that are computed lazily and cached as
+    # attributes, and from which the metrics are computed
+    _CACHED_PRIMITIVES = [
+        '_class_i_arr', '_label_arr', '_num_patches_dict', 'landscape_area',
+        '_class_num_cells_ser', '_patch_class_ser', '_patch_area_ser',
+        '_patch_perimeter_ser', '_patch_euclidean_nearest_neighbor_ser',
+        '_directional_adjacency_arr', '_adjacency_df', '_class_summary_df',
+        '_class_distribution_dfs'
+    ]
+    # the cached primitives that hold per-cell or per-patch data, i.e., all
+    # but the per-class (or landscape-wide) summaries
+    _PATCH_PRIMITIVES = [
+        '_class_i_arr', '_label_arr', '_patch_class_ser', '_patch_area_ser',
+        '_patch_perimeter_ser', '_patch_euclidean_nearest_neighbor_ser'
+    ]
+    _CACHE_POLICIES = ['all', 'summaries', 'none']
+
     # compute methods
 
+    def _get_num_threads(self):
+        if self.n_threads is None:
+            return 1
+        elif self.n_threads < 0:
+            return max(multiprocessing.cpu_count() + 1 + self.n_threads, 1)
+        else:
+            return self.n_threads
+
+    def _map_classes(self, func, args):
+        # apply `func` to each of `args` (one for each class), in a pool of
+        # `n_threads` threads if more than one, and return the results in
+        # the order of `args`
+        args = list(args)
+        num_threads = min(self._get_num_threads(), len(args))
+        if num_threads < 2:
+            return list(map(func, args))
+
+        pool = ThreadPool(num_threads)
+        try:
+            return pool.map(func, args)
+        finally:
+            pool.close()
+            pool.join()
+
     def class_label(self, class_val):
-        return ndimage.label(self.landscape_arr == class_val, KERNEL_MOORE)
+        class_i = np.searchsorted(self.classes, class_val)
+        if class_i < len(self.classes) and \
+           self.classes[class_i] == class_val:
+            class_cond = self._class_i_arr == class_i
+        else:
+            class_cond = np.zeros(self._class_i_arr.shape, dtype=bool)
+
+        return ndimage.label(class_cond, KERNEL_MOORE)
 
     # compute methods to obtain a scalar from an array
 
@@ -142,7 +345,7 @@ class Landscape:
         # get a 'boolean-like' integer array where one indicates that the cell
         # corresponds to some class value whereas zero indicates that the cell
         # corresponds to a nodata value
-        data_arr = (self.landscape_arr != self.nodata).astype(np.int8)
+        data_arr = (self._class_i_arr != len(self.classes)).astype(np.int8)
 
         # use a convolution to determine which edges should be exluded from the
         # perimeter's width and height
@@ -154,6 +357,103 @@ class Landscape:
         return perimeter_width * self.cell_width + \
             perimeter_height * self.cell_height
 
+    # compute methods to obtain arrays with the same shape as the input array
+
+    def _compute_class_i_arr(self, arr):
+        # reclassify `arr` so that each cell holds the index of its class
+        # within `self.classes`, and nodata (and any other value that is not
+        # a class) is assigned the extra index `len(self.classes)`. The
+        # resulting array is of the smallest unsigned integer dtype that can
+        # hold such indices (i.e., uint8 for up to 255 classes)
+        num_classes = len(self.classes)
+        dtype = np.min_scalar_type(num_classes)
+        if num_classes == 0:
+            return np.zeros(arr.shape, dtype=dtype)
+
+        if np.issubdtype(arr.dtype, np.integer):
+            arr_min, arr_max = int(arr.min()), int(arr.max())
+            if arr_max - arr_min < 2**16:
+                # the raster values span a small range, so we can reclassify
+                # them with a lookup table
+                lut = np.full(arr_max - arr_min + 1, num_classes, dtype=dtype)
+                classes = self.classes.astype(np.int64)
+                class_cond = (classes >= arr_min) & (classes <= arr_max)
+                lut[classes[class_cond] - arr_min] = np.arange(
+                    num_classes)[class_cond]
+                if arr_min == 0:
+                    return lut[arr]
+                else:
+                    return lut[arr.astype(np.int64) - arr_min]
+
+        class_i_arr = np.searchsorted(self.classes, arr)
+        class_i_arr[class_i_arr == num_classes] = 0
+        class_i_arr[self.classes[class_i_arr] != arr] = num_classes
+
+        return class_i_arr.astype(dtype)
+
+    def _compute_label_arr(self, class_i_arr):
+        # label the patches of all the classes into a single array, so that
+        # each patch gets a landscape-wide label. The labels of each class
+        # are offset by the number of patches of the preceding classes,
+        # therefore the patches (and thus the rows of the patch-level series)
+        # are sorted by class. The cells of each class are found in the
+        # reclassified array (see `_compute_class_i_arr`)
+        label_arr = np.zeros(class_i_arr.shape, dtype=np.int32)
+        # reuse the same buffers for every class (of each thread, see
+        # `n_threads`) in order to avoid allocating full-size temporary
+        # arrays at each iteration
+        buffers = threading.local()
+
+        def _label_class(class_i):
+            try:
+                class_cond = buffers.class_cond
+                class_label_arr = buffers.class_label_arr
+            except AttributeError:
+                class_cond = buffers.class_cond = np.empty(
+                    class_i_arr.shape, dtype=bool)
+                class_label_arr = buffers.class_label_arr = np.empty(
+                    class_i_arr.shape, dtype=np.int32)
+            np.equal(class_i_arr, class_i, out=class_cond)
+            # if `output` is an array, `ndimage.label` returns only the number
+            # of features
+            class_num_patches = ndimage.label(class_cond, KERNEL_MOORE,
+                                              output=class_label_arr)
+            # the cells of the classes are disjoint, so the threads never
+            # write the same cells of `label_arr`
+            np.copyto(label_arr, class_label_arr, where=class_cond)
+            return class_num_patches
+
+        num_patches = self._map_classes(_label_class,
+                                        range(len(self.classes)))
+
+        # now that the number of patches of each class is known, offset the
+        # labels of each class by the number of patches of the preceding
+        # classes (the nodata index gets a zero offset). Proceed by blocks of
+        # rows in order to avoid a full-size temporary array
+        offsets = np.zeros(len(self.classes) + 1, dtype=np.int32)
+        np.cumsum(num_patches[:-1], out=offsets[1:-1])
+        num_block_rows = max(2**22 // max(label_arr[:1].size, 1), 1)
+        for i in range(0, len(label_arr), num_block_rows):
+            label_arr[i:i + num_block_rows] += offsets[
+                class_i_arr[i:i + num_block_rows]]
+
+        return label_arr, num_patches
+
+    # compute methods to obtain adjacencies
+
+    def _count_adjacencies(self, class_i_arr_a, class_i_arr_b):
+        # encode each pair of adjacent cells `(i, j)` (i.e., one of
+        # `class_i_arr_a` and its counterpart in `class_i_arr_b`) as
+        # `i * (num_classes + 1) + j`, so that the adjacencies between all the
+        # pairs of classes (and nodata) can be counted with a single
+        # `np.bincount`
+        n = len(self.classes) + 1
+        dtype = np.min_scalar_type(n * n - 1)
+        code_arr = class_i_arr_a.astype(dtype) * n
+        code_arr += class_i_arr_b.astype(dtype, copy=False)
+
+        return np.bincount(code_arr.ravel(), minlength=n * n).reshape(n, n)
+
     # compute methods to obtain patchwise scalars
 
     def compute_patch_areas(self, label_arr):
@@ -162,103 +462,146 @@ class Landscape:
         return np.bincount(label_arr.ravel())[1:] * self.cell_area
 
     def compute_patch_perimeters(self, label_arr):
-        # NOTE: performance comparison of `patch_perimeters` as np.array of
-        # fixed size with `patch_perimeters[i] = ...` within the loop is
-        # slower and less Pythonic but can lead to better performances if
-        # optimized via Cython/numba
-        patch_perimeters = []
-        # `ndimage.find_objects` only finds the (rectangular) bounds; there
-        # might be parts of other patches within such bounds, so we need to
-        # check which pixels correspond to the patch of interest. Since
-        # `ndimage.label` labels patches with an enumeration starting by 1, we
-        # can use Python's built-in `enumerate`
-        # NOTE: feature-wise iteration could this be done with
-        # `ndimage.labeled_comprehension(
-        #     label_arr, label_arr, np.arange(1, num_patches + 1),
-        #     _compute_arr_perimeter, np.float, default=None)`
-        # ?
-        # I suspect no, because each feature array is flattened, which does
-        # not allow for the computation of the perimeter or other shape metrics
-        for i, patch_slice in enumerate(
-                ndimage.find_objects(label_arr), start=1):
-            patch_arr = np.pad(label_arr[patch_slice] == i, pad_width=1,
-                               mode='constant',
-                               constant_values=False)  # self.nodata
-
-            patch_perimeters.append(self.compute_arr_perimeter(patch_arr))
-
-        return patch_perimeters
+        # instead of iterating over each patch (e.g., with
+        # `ndimage.find_objects`), we count the transitions between different
+        # labels over the whole label array at once, and then accumulate them
+        # for each label with `np.bincount`. Note that since `ndimage.label`
+        # uses the zero label for the background, the edges with other
+        # classes and nodata are properly counted (and then dropped from the
+        # counts with the `[1:]` slicing)
+        minlength = label_arr.max() + 1
+
+        def _count_transitions(arr_a, arr_b):
+            cond = arr_a != arr_b
+            return np.bincount(arr_a[cond], minlength=minlength) + \
+                np.bincount(arr_b[cond], minlength=minlength)
+
+        # transitions between consecutive rows correspond to edges of length
+        # `cell_width`, whereas transitions between consecutive columns
+        # correspond to edges of length `cell_height`. The cells of the first
+        # and last rows (columns) are also bounded by the landscape boundary,
+        # which we add here instead of padding the label array
+        width_counts = _count_transitions(
+            label_arr[1:, :], label_arr[:-1, :]) + np.bincount(
+                label_arr[0, :], minlength=minlength) + np.bincount(
+                    label_arr[-1, :], minlength=minlength)
+        height_counts = _count_transitions(
+            label_arr[:, 1:], label_arr[:, :-1]) + np.bincount(
+                label_arr[:, 0], minlength=minlength) + np.bincount(
+                    label_arr[:, -1], minlength=minlength)
+
+        return (width_counts * self.cell_width +
+                height_counts * self.cell_height)[1:]
+
+    def _compute_boundary_cond(self, label_arr):
+        # boolean array indicating the cells of `label_arr` that lie at the
+        # boundary of their patch, i.e., those that have at least one
+        # orthogonal neighbor with a different label. The closest pair of
+        # cells between two patches is always formed by boundary cells, since
+        # an interior cell always has an orthogonal neighbor (of its own
+        # patch) that is closer to any cell of another patch
+        boundary_cond = np.zeros(label_arr.shape, dtype=bool)
+        cond = label_arr[1:, :] != label_arr[:-1, :]
+        boundary_cond[1:, :] |= cond
+        boundary_cond[:-1, :] |= cond
+        cond = label_arr[:, 1:] != label_arr[:, :-1]
+        boundary_cond[:, 1:] |= cond
+        boundary_cond[:, :-1] |= cond
+        # note that `ndimage.label` uses zero values to indicate the
+        # background (even if our landscape raster uses a different nodata
+        # value, i.e., `self.nodata`)
+        boundary_cond &= label_arr != 0
+
+        return boundary_cond
+
+    def _compute_boundary_euclidean_nearest_neighbor(
+            self, coords, labels, num_patches, workers=-1):
+        # `coords` are the (row, column) coordinates of the boundary cells of
+        # a class and `labels` their respective labels (with an enumeration
+        # starting by 1). We build a single KDTree with the boundary cells of
+        # all the patches and query the k nearest neighbors of each boundary
+        # cell at once, so that the closest cell of another patch is the
+        # first neighbor whose label differs from the label of the queried
+        # cell
+        tree = spatial.cKDTree(coords)
+        num_coords = len(coords)
+        enn = np.full(num_patches, np.inf)
+
+        k = min(8, num_coords)
+        query_i = np.arange(num_coords)
+        while query_i.size > 0:
+            dists, ids = tree.query(coords[query_i], k=k,
+                                    **{KDTREE_WORKERS_KW: workers})
+            query_labels = labels[query_i]
+            foreign = labels[ids] != query_labels[:, np.newaxis]
+            found = np.any(foreign, axis=1)
+            found_dists = dists[found, np.argmax(foreign[found], axis=1)]
+            np.minimum.at(enn, query_labels[found] - 1, found_dists)
+            if k == num_coords:
+                # since there are at least two patches, all the cells have
+                # found their closest foreign cell
+                break
+            # the cells whose k nearest neighbors are all from their own
+            # patch must be queried again with a larger k, unless their k-th
+            # nearest distance already exceeds the minimum distance found so
+            # far for their patch
+            pending = ~found & (dists[:, -1] < enn[query_labels - 1])
+            query_i = query_i[pending]
+            k = min(2 * k, num_coords)
+
+        if np.isclose(self.cell_width, self.cell_height):
+            enn *= self.cell_width
+        else:
+            enn *= np.sqrt(self.cell_area)
+
+        return enn
 
     def compute_patch_euclidean_nearest_neighbor(self, label_arr):
         # label_arr, num_patches = self.class_label(class_val)
+        num_patches = np.max(label_arr)
 
-        if np.max(label_arr) < 2:  # num_patches < 2
+        if num_patches < 2:
             return np.array([np.nan])
         else:
-            # get coordinates with non-zero values
-            # Note that `label_arr` will use zero values to indicate nodata
-            # (even if our landscape raster uses a different nodata value,
-            # i.e., `self.nodata`)
-            I, J = np.nonzero(label_arr)
-            labels = label_arr[I, J]  # this gives all the non-zero labels
-            coords = np.column_stack((I, J))
-
-            # sort labels/coordinates by the feature value
-            sorter = np.argsort(labels)
-            labels = labels[sorter]
-            coords = coords[sorter]
-
-            # # begin CDIST
-            # # get feature-vs-feature distance matrix
-            # sq_dists = spatial.distance.cdist(coords, coords,
-            #                                   'sqeuclidean')
-            # start_idx = np.flatnonzero(np.r_[1, np.diff(labels)])
-            # nonzero_vs_feat = np.minimum.reduceat(sq_dists, start_idx,
-            #                                       axis=1)
-            # feat_vs_feat = np.minimum.reduceat(
-            #     nonzero_vs_feat, start_idx, axis=0)
-
-            # # get min edge-to-edge distance to closest patch of the same
-            # # class
-            # feat_vs_feat[feat_vs_feat == 0] = np.nan
-            # enn = np.sqrt(np.nanmin(feat_vs_feat, axis=1))
-            # # end CDIST
-
-            # begin KDTree
-            unique_labels = np.unique(labels)
-
-            enn = np.empty(len(unique_labels))
-            for unique_label in unique_labels:
-                # we build a KDTree with all the coords that are not part of
-                # the current feature
-                tree = spatial.cKDTree(coords[labels != unique_label])
-                # now, for each coord of the current feature, we query the
-                # closest coord of the tree (which does not include points of
-                # the current feature)
-                mindist, minid = tree.query(coords[labels == unique_label])
-                # note that `mindist` and `minid` will be 1D arrays, whose
-                # lengths correspond to the number of pixels within the
-                # current feature.
-                # Each position of `mindist` and `mindid` matches the
-                # corresponding pixel of the current feature to its closest
-                # neighbor from the non-feature tree. Since we are only
-                # interested in the closest distance, we will just get
-                # `min(mindist)`. Note that because of the symmetry, we could
-                # use `minid` to assign this same distance to the counterpart
-                # of `unique_label`.
-                # Nevertheless, the overheads of maintaining the required data
-                # structure would most likely exceed any potential gains.
-                # We use `unique_label - 1` to obtain the corresponding 0-based
-                # index
-                enn[unique_label - 1] = min(mindist)
-            # end KDTree
-
-            if np.isclose(self.cell_width, self.cell_height):
-                enn *= self.cell_width
-            else:
-                enn *= np.sqrt(self.cell_area)
-
-            return enn
+            # only the cells at the boundary of the patches need to be
+            # considered (see `_compute_boundary_cond`)
+            I, J = np.nonzero(self._compute_boundary_cond(label_arr))
+            return self._compute_boundary_euclidean_nearest_neighbor(
+                np.column_stack((I, J)), label_arr[I, J], num_patches)
+
+    def _compute_patch_euclidean_nearest_neighbor_arr(self, rows, cols,
+                                                      labels):
+        # `rows`, `cols` are the coordinates of the boundary cells of all the
+        # patches of the landscape and `labels` their landscape-wide labels.
+        # Sort them by label, so that they are also sorted by class
+        sorter = np.argsort(labels)
+        labels = labels[sorter]
+        coords = np.column_stack((rows[sorter], cols[sorter]))
+
+        # if the classes are processed by several threads, each query uses a
+        # single worker so that the CPUs are not oversubscribed
+        if self._get_num_threads() > 1:
+            workers = 1
+        else:
+            workers = -1
+
+        def _class_enn(class_args):
+            num_patches, offset = class_args
+            if num_patches < 2:
+                return np.array([np.nan])
+            start, end = np.searchsorted(
+                labels, [offset + 1, offset + num_patches + 1])
+            return self._compute_boundary_euclidean_nearest_neighbor(
+                coords[start:end], labels[start:end] - offset, num_patches,
+                workers=workers)
+
+        num_patches = [
+            self._num_patches_dict[class_val] for class_val in self.classes
+        ]
+        offsets = np.concatenate([[0], np.cumsum(num_patches)[:-1]])
+        enn_arrs = self._map_classes(_class_enn, zip(num_patches, offsets))
+
+        return np.concatenate(enn_arrs)
 
     # compute metrics from area and perimeter series
 
@@ -311,18 +654,146 @@ class Landscape:
 
     # properties
 
+    @property
+    def _content_key(self):
+        # hash of the landscape array, resolution and nodata value, i.e., of
+        # everything that determines the results computed for the landscape
+        try:
+            return self._cached_content_key
+        except AttributeError:
+            landscape_arr = self.landscape_arr
+            content_hash = hashlib.sha1()
+            # hash by blocks of rows so that non-contiguous arrays (e.g.,
+            # views) are not copied as a whole
+            num_block_rows = max(2**22 // max(landscape_arr[:1].nbytes, 1), 1)
+            for i in range(0, len(landscape_arr), num_block_rows):
+                content_hash.update(
+                    np.ascontiguousarray(landscape_arr[i:i +
+                                                       num_block_rows]).data)
+            self._cached_content_key = _compute_cache_key(
+                content_hash.hexdigest(), str(landscape_arr.dtype),
+                landscape_arr.shape, self.cell_width, self.cell_height,
+                repr(self.nodata))
+
+            return self._cached_content_key
+
+    def _get_cached(self, compute, *key_parts):
+        # get the result of `compute` from the on-disk cache (if any), where
+        # it is stored under the content key and `key_parts`
+        if self.metrics_cache is None:
+            return compute()
+
+        key = _compute_cache_key(self._content_key, *key_parts)
+        try:
+            value = self.metrics_cache[key]
+            hit = True
+        except KeyError:
+            value = compute()
+            self.metrics_cache[key] = value
+            hit = False
+
+        # the key parts are either the name of a cached primitive or the
+        # level, name and keyword arguments of a metric
+        if len(key_parts) == 1:
+            _add_disk_lookup('primitive', key_parts[0], hit)
+        else:
+            _add_disk_lookup('metric', key_parts[1], hit)
+
+        return value
+
+    @property
+    def cache_sizes(self):
+        """Size (in bytes) of each of the intermediate structures that are
+        currently cached in memory"""
+        primitives = [
+            primitive for primitive in self._CACHED_PRIMITIVES
+            if _get_cached_attr(primitive) in vars(self)
+        ]
+        return pd.Series([
+            _get_nbytes(getattr(self, _get_cached_attr(primitive)))
+            for primitive in primitives
+        ], index=primitives, name='nbytes', dtype=np.int64)
+
+    def clear_cache(self, keep_summaries=False):
+        """
+        Releases the intermediate structures cached in memory, which will be
+        computed again if needed
+
+        Parameters
+        ----------
+        keep_summaries : bool, default False
+            Whether the per-class summaries (e.g., the number of patches of
+            each class and the adjacency table) are kept, so that only the
+            per-cell and per-patch structures (e.g., the label array and the
+            patch areas) are released
+        """
+        for primitive in self._CACHED_PRIMITIVES:
+            # the landscape area is just a scalar (which `TiledLandscape`
+            # computes upon initialization), so it is always kept
+            if primitive == 'landscape_area' or (
+                    keep_summaries
+                    and primitive not in self._PATCH_PRIMITIVES):
+                continue
+            vars(self).pop(_get_cached_attr(primitive), None)
+
+    def _apply_cache_policy(self, cache_policy=None):
+        # release the cached structures that are not kept by `cache_policy`
+        # (by default, the policy of the instance)
+        if cache_policy is None:
+            cache_policy = self.cache_policy
+        if cache_policy == 'summaries':
+            self.clear_cache(keep_summaries=True)
+        elif cache_policy == 'none':
+            self.clear_cache()
+
+    @property
+    def _class_i_arr(self):
+        try:
+            return self._cached_class_i_arr
+        except AttributeError:
+            self._cached_class_i_arr = self._compute_class_i_arr(
+                self.landscape_arr)
+
+            return self._cached_class_i_arr
+
+    @property
+    def _label_arr(self):
+        try:
+            return self._cached_label_arr
+        except AttributeError:
+            label_arr, num_patches = self._get_cached(
+                lambda: self._compute_label_arr(self._class_i_arr),
+                '_label_arr')
+
+            self._cached_label_arr = label_arr
+            self._cached_num_patches_dict = dict(
+                zip(self.classes, num_patches))
+
+            return self._cached_label_arr
+
     @property
     def _num_patches_dict(self):
         try:
             return self._cached_num_patches_dict
         except AttributeError:
-            self._cached_num_patches_dict = {
-                class_val: self.class_label(class_val)[1]
-                for class_val in self.classes
-            }
+            # the number of patches of each class is obtained when labeling
+            self._label_arr
 
             return self._cached_num_patches_dict
 
+    def _get_class_label_arr(self, class_val):
+        # get a label array where only the patches of `class_val` are labeled
+        # (with an enumeration starting by 1, as in `class_label`) out of the
+        # landscape-wide label array
+        label_arr = self._label_arr
+        # since the patches are sorted by class, the label offset of
+        # `class_val` is the number of patches of the preceding classes
+        offset = np.searchsorted(self._patch_class_ser.values, class_val)
+        num_patches = self._num_patches_dict[class_val]
+        class_cond = (label_arr > offset) & (label_arr <= offset + num_patches)
+
+        return np.where(class_cond, label_arr - offset, 0)
+
     @property
     def landscape_area(self):
         try:
@@ -333,19 +804,39 @@ class Landscape:
                 landscape_num_cells = np.count_nonzero(self.landscape_arr)
             else:
                 landscape_num_cells = np.sum(self.landscape_arr != self.nodata)
+            if np.issubdtype(self.landscape_arr.dtype, np.floating):
+                # NaN cells are treated as nodata (see `_compute_classes`)
+                landscape_num_cells -= np.count_nonzero(
+                    np.isnan(self.landscape_arr))
 
             self._landscape_area = landscape_num_cells * self.cell_area
 
             return self._landscape_area
 
+    @property
+    def _class_num_cells_ser(self):
+        try:
+            return self._cached_class_num_cells_ser
+        except AttributeError:
+            # the cell counts are obtained upon the discovery of the classes
+            # (see `_compute_classes`), otherwise (e.g., for children classes
+            # that do not call `Landscape.__init__`), since each cell has two
+            # vertical sides, the number of cells of each class is half the
+            # sum of its row in the vertical adjacency array
+            self._cached_class_num_cells_ser = pd.Series(
+                np.sum(self._directional_adjacency_arr[0][:len(self.classes)],
+                       axis=1) // 2, index=self.classes, name='num_cells')
+
+            return self._cached_class_num_cells_ser
+
     @property
     def _patch_class_ser(self):
         try:
             return self._cached_patch_class_ser
         except AttributeError:
             self._cached_patch_class_ser = pd.Series(
-                np.concatenate([
-                    np.full(self._num_patches_dict[class_val], class_val)
+                np.repeat(self.classes, [
+                    self._num_patches_dict[class_val]
                     for class_val in self.classes
                 ]), name='class_val')
 
@@ -357,10 +848,7 @@ class Landscape:
             return self._cached_patch_area_ser
         except AttributeError:
             self._cached_patch_area_ser = pd.Series(
-                np.concatenate([
-                    self.compute_patch_areas(self.class_label(class_val)[0])
-                    for class_val in self.classes
-                ]), name='area')
+                self.compute_patch_areas(self._label_arr), name='area')
 
             return self._cached_patch_area_ser
 
@@ -370,11 +858,8 @@ class Landscape:
             return self._cached_patch_perimeter_ser
         except AttributeError:
             self._cached_patch_perimeter_ser = pd.Series(
-                np.concatenate([
-                    self.compute_patch_perimeters(
-                        self.class_label(class_val)[0])
-                    for class_val in self.classes
-                ]), name='perimeter')
+                self.compute_patch_perimeters(self._label_arr),
+                name='perimeter')
 
             return self._cached_patch_perimeter_ser
 
@@ -383,67 +868,55 @@ class Landscape:
         try:
             return self._cached_patch_euclidean_nearest_neighbor_ser
         except AttributeError:
+            label_arr = self._label_arr
+            I, J = np.nonzero(self._compute_boundary_cond(label_arr))
             self._cached_patch_euclidean_nearest_neighbor_ser = pd.Series(
-                np.concatenate([
-                    self.compute_patch_euclidean_nearest_neighbor(
-                        self.class_label(class_val)[0])
-                    for class_val in self.classes
-                ]), name='euclidean_nearest_neighbor')
+                self._compute_patch_euclidean_nearest_neighbor_arr(
+                    I, J, label_arr[I, J]), name='euclidean_nearest_neighbor')
 
             return self._cached_patch_euclidean_nearest_neighbor_ser
 
+    @property
+    def _directional_adjacency_arr(self):
+        try:
+            return self._cached_directional_adjacency_arr
+        except AttributeError:
+            self._cached_directional_adjacency_arr = self._get_cached(
+                self._compute_directional_adjacency_arr,
+                '_directional_adjacency_arr')
+
+            return self._cached_directional_adjacency_arr
+
+    def _compute_directional_adjacency_arr(self):
+        # pad the reclassified array with the nodata index so that the
+        # adjacencies with the landscape boundary are counted as adjacencies
+        # with nodata. Note that NaN cells also get the nodata index (see
+        # `_compute_class_i_arr`), so the adjacencies with them are counted
+        # in the nodata column (in earlier versions, they were not counted
+        # at all, although NaN cells were part of the landscape area), which
+        # is consistent with `landscape_area` and the class edges
+        class_i_arr = np.pad(self._class_i_arr, pad_width=1, mode='constant',
+                             constant_values=len(self.classes))
+        adjacency_arr = np.stack([
+            self._count_adjacencies(class_i_arr[1:, :], class_i_arr[:-1, :]),
+            self._count_adjacencies(class_i_arr[:, 1:], class_i_arr[:, :-1])
+        ])
+        # each adjacency between `i` and `j` must be counted both in the
+        # `(i, j)` and the `(j, i)` positions (i.e., adjacencies within the
+        # same class are counted twice). The first array holds the adjacencies
+        # between consecutive rows (i.e., edges of length `cell_width`) and
+        # the second one the adjacencies between consecutive columns (i.e.,
+        # edges of length `cell_height`)
+        return adjacency_arr + np.transpose(adjacency_arr, (0, 2, 1))
+
     @property
     def _adjacency_df(self):
         try:
             return self._cached_adjacency_df
         except AttributeError:
-            num_classes = len(self.classes)
-            # first prepare a reclassified array of the landscape where we can
-            # use a convolution to determine the adjacencies
-            reclassified_arr = np.copy(self.landscape_arr)
-            for i, class_val in enumerate(self.classes, start=1):
-                reclassified_arr[self.landscape_arr == class_val] = i
-            reclassified_arr[self.landscape_arr == self.
-                             nodata] = num_classes + 1
-            # now let's prepare the adjacency table. The +1 is to add the
-            # border/nodata column at the end
-            adjacency_table_arr = np.zeros((num_classes, num_classes + 1),
-                                           dtype=np.int)
-
-            # let's define this function to get the number of adjacencies in
-            # `arr` between classes `i` and `j` through a convolution
-            def _num_adjacencies(arr, i, j, cval=0):
-                arr_ik = np.where(np.isin(arr, [i, j]), arr, 0)
-                c = i + j
-                adj_ik_above = (ndimage.convolve(
-                    arr_ik, KERNEL_ABOVE, mode='constant',
-                    cval=cval) == c) & (arr_ik == i)
-                adj_ik_below = (ndimage.convolve(
-                    arr_ik, KERNEL_BELOW, mode='constant',
-                    cval=cval) == c) & (arr_ik == i)
-                adj_ik_left = (ndimage.convolve(
-                    arr_ik, KERNEL_LEFT, mode='constant',
-                    cval=cval) == c) & (arr_ik == i)
-                adj_ik_right = (ndimage.convolve(
-                    arr_ik, KERNEL_RIGHT, mode='constant',
-                    cval=cval) == c) & (arr_ik == i)
-                return np.sum(adj_ik_above) + np.sum(adj_ik_below) + np.sum(
-                    adj_ik_left) + np.sum(adj_ik_right)
-
-            # finally let's iterate over all the combinations of classes to
-            # apply the convolution and obtain all the adjacencies
-            class_range = range(1, num_classes + 1)
-
-            for i, j in combinations_with_replacement(class_range, 2):
-                num_adjacencies = _num_adjacencies(reclassified_arr, i, j)
-                adjacency_table_arr[i - 1, j - 1] = num_adjacencies
-                adjacency_table_arr[j - 1, i - 1] = num_adjacencies
-
-            # nodata
-            for i in class_range:
-                nodata_j = num_classes + 1
-                adjacency_table_arr[i - 1, nodata_j - 1] = _num_adjacencies(
-                    reclassified_arr, i, nodata_j, cval=nodata_j)
+            # add up both directions and drop the row of nodata
+            adjacency_table_arr = np.sum(self._directional_adjacency_arr,
+                                         axis=0)[:-1]
 
             self._cached_adjacency_df = pd.DataFrame(
                 adjacency_table_arr, index=self.classes,
@@ -451,6 +924,56 @@ class Landscape:
 
             return self._cached_adjacency_df
 
+    @property
+    def _class_summary_df(self):
+        try:
+            return self._cached_class_summary_df
+        except AttributeError:
+            num_classes = len(self.classes)
+            vertical_arr, horizontal_arr = self._directional_adjacency_arr
+            num_cells = self._class_num_cells_ser.values
+
+            # the edges between each class and the other classes (i.e.,
+            # excluding nodata and the landscape boundary), which are all the
+            # adjacencies except those within the class itself
+            def _class_edges(adjacency_arr):
+                class_adjacency_arr = adjacency_arr[:num_classes, :num_classes]
+                return np.sum(class_adjacency_arr,
+                              axis=1) - np.diag(class_adjacency_arr)
+
+            edge = _class_edges(vertical_arr) * self.cell_width + \
+                _class_edges(horizontal_arr) * self.cell_height
+            edge_boundary = edge + vertical_arr[:num_classes, -1] * \
+                self.cell_width + horizontal_arr[:num_classes, -1] * \
+                self.cell_height
+
+            # since the patches are sorted by class, we can get the largest
+            # patch of each class with a single `np.maximum.reduceat`
+            num_patches = np.array([
+                self._num_patches_dict[class_val]
+                for class_val in self.classes
+            ])
+            if num_classes > 0:
+                max_patch_area = np.maximum.reduceat(
+                    self._patch_area_ser.values,
+                    np.concatenate([[0], np.cumsum(num_patches)[:-1]]))
+            else:
+                max_patch_area = np.array([])
+
+            self._cached_class_summary_df = pd.DataFrame(
+                {
+                    'num_cells': num_cells,
+                    'num_patches': num_patches,
+                    'edge': edge,
+                    'edge_boundary': edge_boundary,
+                    'max_patch_area': max_patch_area
+                }, index=self.classes, columns=[
+                    'num_cells', 'num_patches', 'edge', 'edge_boundary',
+                    'max_patch_area'
+                ])
+
+            return self._cached_class_summary_df
+
     # small utilities to get patch areas/perimeters for a particular class only
 
     def _get_patch_area_ser(self, class_val=None):
@@ -494,56 +1017,114 @@ class Landscape:
 
     # metric distribution statistics
 
+    def _get_class_distribution_df(self, patch_metric_method,
+                                   patch_metric_method_kwargs):
+        # compute the distribution statistics of a patch-level metric for all
+        # the classes at once. Since the patches are sorted by class, each
+        # class corresponds to a contiguous group of patches, so we can
+        # reduce each group with the `reduceat` method of numpy's ufuncs
+        # instead of masking the patch-level series for each class
+        key = (patch_metric_method.__name__,
+               tuple(sorted(patch_metric_method_kwargs.items())))
+        try:
+            class_distribution_dfs = self._cached_class_distribution_dfs
+        except AttributeError:
+            class_distribution_dfs = self._cached_class_distribution_dfs = {}
+        try:
+            return class_distribution_dfs[key]
+        except KeyError:
+            values = patch_metric_method(
+                **patch_metric_method_kwargs)[key[0]].values
+            weights = self._patch_area_ser.values
+            num_patches = self._class_summary_df['num_patches'].values
+            starts = np.concatenate([[0], np.cumsum(num_patches)[:-1]])
+
+            def _group_sum(arr):
+                return np.add.reduceat(arr, starts)
+
+            mn = _group_sum(values) / num_patches
+            am = _group_sum(values * weights) / _group_sum(weights)
+            # to get the median, sort the values within each group
+            sorted_values = values[np.lexsort(
+                (values, np.repeat(np.arange(len(num_patches)),
+                                   num_patches)))]
+            md = (sorted_values[starts + (num_patches - 1) // 2] +
+                  sorted_values[starts + num_patches // 2]) / 2
+            ra = np.maximum.reduceat(values, starts) - np.minimum.reduceat(
+                values, starts)
+            sd = np.sqrt(
+                _group_sum((values - np.repeat(mn, num_patches))**2) /
+                num_patches)
+
+            class_distribution_df = pd.DataFrame(
+                {
+                    'mn': mn,
+                    'am': am,
+                    'md': md,
+                    'ra': ra,
+                    'sd': sd,
+                    'cv': sd / mn
+                }, index=self.classes, columns=Landscape._suffixes)
+            class_distribution_dfs[key] = class_distribution_df
+
+            return class_distribution_df
+
     def _metric_reduce(self, class_val, patch_metric_method,
-                       patch_metric_method_kwargs, reduce_method):
+                       patch_metric_method_kwargs, reduce_method, suffix):
+        if class_val is not None:
+            return self._get_class_distribution_df(
+                patch_metric_method,
+                patch_metric_method_kwargs).loc[class_val, suffix]
+
         patch_metrics = patch_metric_method(class_val,
                                             **patch_metric_method_kwargs)
-        if class_val is None:
-            # ACHTUNG: dropping columns from a `pd.DataFrame` until leaving it
-            # with only one column will still return a `pd.DataFrame`, so we
-            # must convert to `pd.Series` manually (e.g., with `iloc`)
-            patch_metrics = patch_metrics.drop('class_val', axis=1).iloc[:, 0]
+        # ACHTUNG: dropping columns from a `pd.DataFrame` until leaving it
+        # with only one column will still return a `pd.DataFrame`, so we
+        # must convert to `pd.Series` manually (e.g., with `iloc`)
+        patch_metrics = patch_metrics.drop('class_val', axis=1).iloc[:, 0]
 
         return reduce_method(patch_metrics)
 
     def _metric_mn(self, class_val, patch_metric_method,
                    patch_metric_method_kwargs={}):
         return self._metric_reduce(class_val, patch_metric_method,
-                                   patch_metric_method_kwargs, np.mean)
+                                   patch_metric_method_kwargs, np.mean, 'mn')
 
     def _metric_am(self, class_val, patch_metric_method,
                    patch_metric_method_kwargs={}):
-        # `area` can be `pd.Series` or `pd.DataFrame`
-        area = self.area(class_val)
-
         if class_val is None:
-            area = area['area']
+            reduce_method = partial(np.average,
+                                    weights=self._patch_area_ser)
+        else:
+            # the weights are taken care of in `_get_class_distribution_df`
+            reduce_method = None
 
         return self._metric_reduce(class_val, patch_metric_method,
-                                   patch_metric_method_kwargs,
-                                   partial(np.average, weights=area))
+                                   patch_metric_method_kwargs, reduce_method,
+                                   'am')
 
     def _metric_md(self, class_val, patch_metric_method,
                    patch_metric_method_kwargs={}):
         return self._metric_reduce(class_val, patch_metric_method,
-                                   patch_metric_method_kwargs, np.median)
+                                   patch_metric_method_kwargs, np.median,
+                                   'md')
 
     def _metric_ra(self, class_val, patch_metric_method,
                    patch_metric_method_kwargs={}):
         return self._metric_reduce(class_val, patch_metric_method,
                                    patch_metric_method_kwargs,
-                                   lambda ser: ser.max() - ser.min())
+                                   lambda ser: ser.max() - ser.min(), 'ra')
 
     def _metric_sd(self, class_val, patch_metric_method,
                    patch_metric_method_kwargs={}):
         return self._metric_reduce(class_val, patch_metric_method,
-                                   patch_metric_method_kwargs, np.std)
+                                   patch_metric_method_kwargs, np.std, 'sd')
 
     def _metric_cv(self, class_val, patch_metric_method,
                    patch_metric_method_kwargs={}, percent=True):
         metric_cv = self._metric_reduce(class_val, patch_metric_method,
                                         patch_metric_method_kwargs,
-                                        stats.variation)
+                                        stats.variation, 'cv')
         if percent:
             metric_cv *= 100
 
@@ -853,8 +1434,8 @@ class Landscape:
         if class_val is None:
             total_area = self.landscape_area
         else:
-            area_ser = self._get_patch_area_ser(class_val)
-            total_area = np.sum(area_ser)
+            total_area = self._class_num_cells_ser.loc[class_val] * \
+                self.cell_area
 
         if hectares:
             total_area /= 10000
@@ -883,7 +1464,7 @@ class Landscape:
             when the entire landscape consists of a single patch of such class.
         """
 
-        numerator = np.sum(self._get_patch_area_ser(class_val))
+        numerator = self._class_num_cells_ser.loc[class_val] * self.cell_area
 
         if percent:
             numerator *= 100
@@ -907,9 +1488,9 @@ class Landscape:
             np >= 1
         """
         if class_val is None:
-            num_patches = np.sum(list(self._num_patches_dict.values()))
+            num_patches = np.sum(self._class_summary_df['num_patches'])
         else:
-            num_patches = self._num_patches_dict[class_val]
+            num_patches = self._class_summary_df.loc[class_val, 'num_patches']
 
         return num_patches
 
@@ -943,9 +1524,9 @@ class Landscape:
         # `numerator = self.number_of_patches(class_val)`
         # or avoid reusing metric's methods?
         if class_val is None:
-            numerator = np.sum(list(self._num_patches_dict.values()))
+            numerator = np.sum(self._class_summary_df['num_patches'])
         else:
-            numerator = self._num_patches_dict[class_val]
+            numerator = self._class_summary_df.loc[class_val, 'num_patches']
 
         if percent:
             numerator *= 100
@@ -978,9 +1559,11 @@ class Landscape:
             largest patch comprises the totality of the landscape
         """
 
-        area_ser = self._get_patch_area_ser(class_val)
-
-        numerator = np.max(area_ser)
+        if class_val is None:
+            numerator = np.max(self._class_summary_df['max_patch_area'])
+        else:
+            numerator = self._class_summary_df.loc[class_val,
+                                                   'max_patch_area']
 
         if percent:
             numerator *= 100
@@ -1010,22 +1593,27 @@ class Landscape:
         """
 
         if class_val is None:
-            if count_boundary:
-                total_edge = self.compute_arr_perimeter(
-                    np.pad(self.landscape_arr, pad_width=1, mode='constant',
-                           constant_values=self.nodata))
-            else:
-                total_edge = self.compute_arr_edge(
-                    self.landscape_arr != self.nodata)
+            # every edge is counted twice in the (symmetric) adjacency arrays,
+            # i.e., once for each of the two adjacent classes
+            adjacency_arr = self._directional_adjacency_arr
+            if not count_boundary:
+                # exclude the adjacencies with nodata and the landscape
+                # boundary
+                num_classes = len(self.classes)
+                adjacency_arr = adjacency_arr[:, :num_classes, :num_classes]
+            vertical_edges, horizontal_edges = (
+                np.sum(adjacency_arr, axis=(1, 2)) -
+                np.trace(adjacency_arr, axis1=1, axis2=2)) // 2
+            total_edge = vertical_edges * self.cell_width + \
+                horizontal_edges * self.cell_height
         else:
             if count_boundary:
                 # then the total edge is just the sum of the perimeters of all
                 # the patches of the corresponding class
-                perimeter_ser = self._get_patch_perimeter_ser(class_val)
-                total_edge = np.sum(perimeter_ser)
+                total_edge = self._class_summary_df.loc[class_val,
+                                                        'edge_boundary']
             else:
-                total_edge = self.compute_arr_edge(
-                    self.landscape_arr == class_val)
+                total_edge = self._class_summary_df.loc[class_val, 'edge']
 
         return total_edge
 
@@ -1222,19 +1810,24 @@ class Landscape:
         if class_val is None:
             area = self.landscape_area
         else:
-            area = np.sum(self._get_patch_area_ser(class_val))
+            area = self._class_num_cells_ser.loc[class_val] * self.cell_area
 
         # TODO: we make an exception here of the "not reusing other metric's
         # methods within metric's methods" policy, since `total_edge` is a bit
         # puzzling to compute
         perimeter = self.total_edge(class_val, count_boundary=True)
 
-        # `compute shape index` works on vectors, so we need to pass arrays as
-        # arguments and then extract its first (and only element) in order to
-        # return a scalar
+        # `compute shape index` works on vectors, so if we are computing the
+        # metric for a single class (or at the landscape level), we need to
+        # pass arrays as arguments and then extract its first (and only
+        # element) in order to return a scalar
         # TODO: use np.vectorize
-        return self.compute_shape_index(
-            np.array([area]), np.array([perimeter]))[0]
+        if np.ndim(area) == 0:
+            return self.compute_shape_index(
+                np.array([area]), np.array([perimeter]))[0]
+        else:
+            return pd.Series(self.compute_shape_index(area, perimeter),
+                             index=area.index)
 
     # shape
 
@@ -2006,22 +2599,14 @@ class Landscape:
             landscape consists of a single patch.
         """
 
-        _contag = 0
-
-        for i in self.classes:
-            p_i = np.sum(self._get_patch_area_ser(i)) / self.landscape_area
-            # use `.loc` to get the row with `nodata` column ; also so that we
-            # can then get the items by column in the for loop below
-            g_i = self._adjacency_df.loc[i]
-            # print(g_i)
-            g_i_sum = np.sum(g_i)
-            # print(g_i_sum)
-            for k in self.classes:
-                q = p_i * g_i[k] / g_i_sum
-                if q > 0:  # avoid zero-logarithm
-                    _contag += q * np.log(q)
+        p = self._class_num_cells_ser.values * self.cell_area / \
+            self.landscape_area
+        # the sum of each row includes the adjacencies with nodata
+        g = self._adjacency_df.values
+        q = p[:, np.newaxis] * g[:, :-1] / np.sum(g, axis=1)[:, np.newaxis]
+        q = q[q > 0]  # avoid zero-logarithm
 
-        contag = 1 + _contag / (2 * np.log(len(self.classes)))
+        contag = 1 + np.sum(q * np.log(q)) / (2 * np.log(len(self.classes)))
 
         if percent:
             contag *= 100
@@ -2042,13 +2627,10 @@ class Landscape:
             classes becomes more equitable.
         """
 
-        shdi = 0
-        for class_val in self.classes:
-            p_class = np.sum(
-                self._get_patch_area_ser(class_val)) / self.landscape_area
-            shdi += p_class * np.log(p_class)
+        p = self._class_num_cells_ser.values * self.cell_area / \
+            self.landscape_area
 
-        return -shdi
+        return -np.sum(p * np.log(p))
 
     def compute_patch_metrics_df(self, metrics=None, metrics_kws={}):
         """
@@ -2085,7 +2667,10 @@ class Landscape:
             # metrics_dfs = [getattr(self, metric)()]
             # for metric in metrics[1:]:
 
-            metrics_dfs = [self._patch_class_ser]
+            metrics_dfs = [
+                self._get_cached(lambda: self._patch_class_ser, 'patch',
+                                 'class_val')
+            ]
             for metric in metrics:
                 if metric in metrics_kws:
                     metric_kws = metrics_kws[metric]
@@ -2093,14 +2678,17 @@ class Landscape:
                     metric_kws = {}
 
                 metrics_dfs.append(
-                    getattr(self, metric)(**metric_kws).drop(
-                        'class_val', axis=1))
+                    self._get_cached(
+                        lambda: getattr(self, metric)
+                        (**metric_kws).drop('class_val', axis=1), 'patch',
+                        metric, metric_kws))
 
         except AttributeError:
             raise ValueError("{metric} is not among {Landscape.PATCH_METRICS}")
 
         df = pd.concat(metrics_dfs, axis=1)  # [['class_val'] + patch_metrics]
         df.index.name = 'patch_id'
+        self._apply_cache_policy()
 
         return df
 
@@ -2132,27 +2720,49 @@ class Landscape:
         if metrics is None:
             metrics = Landscape.CLASS_METRICS
 
-        try:
-            metrics_sers = []
-            for metric in metrics:
-                if metric in metrics_kws:
-                    metric_kws = metrics_kws[metric]
-                else:
-                    metric_kws = {}
-
+        # check the metric names beforehand rather than catching the
+        # `AttributeError` of `getattr`, which would also hide the errors
+        # raised within the metrics
+        inexistent_metrics = [
+            metric for metric in metrics if metric not in self.CLASS_METRICS
+        ]
+        if inexistent_metrics:
+            raise ValueError("{metrics} are not among {class_metrics}".format(
+                metrics=inexistent_metrics, class_metrics=self.CLASS_METRICS))
+
+        metrics_sers = []
+        for metric in metrics:
+            if metric in metrics_kws:
+                metric_kws = metrics_kws[metric]
+            else:
+                metric_kws = {}
+
+            if metric in Landscape.CLASS_METRICS:
+                # the class-level metrics are computed with elementwise
+                # operations on cached per-class tables (see
+                # `_class_summary_df` and `_get_class_distribution_df`), so
+                # we can compute them for all the classes at once by passing
+                # `self.classes` as `class_val`
+                metric_ser = self._get_cached(
+                    lambda: getattr(self, metric)
+                    (self.classes, **metric_kws), 'class', metric, metric_kws)
+                metric_ser.name = metric
+                metrics_sers.append(metric_ser)
+            else:
+                # metrics added to `CLASS_METRICS` by children classes, which
+                # might not accept an array of classes
                 metrics_sers.append(
-                    pd.Series({
-                        class_val: getattr(self, metric)(class_val, **
-                                                         metric_kws)
-                        for class_val in self.classes
-                    }, name=metric))
-
-        except AttributeError:
-            raise ValueError("{metric} is not among {metrics}".format(
-                metric=metric, metrics=Landscape.CLASS_METRICS))
+                    self._get_cached(
+                        lambda: pd.Series(
+                            {
+                                class_val: getattr(self, metric)
+                                (class_val, **metric_kws)
+                                for class_val in self.classes
+                            }, name=metric), 'class', metric, metric_kws))
 
         df = pd.concat(metrics_sers, axis=1)
         df.index.name = 'class_val'
+        self._apply_cache_policy()
 
         return df
 
@@ -2184,19 +2794,28 @@ class Landscape:
         if metrics is None:
             metrics = Landscape.LANDSCAPE_METRICS
 
-        try:
-            metrics_dict = {}
-            for metric in metrics:
-                if metric in metrics_kws:
-                    metric_kws = metrics_kws[metric]
-                else:
-                    metric_kws = {}
-
-                metrics_dict[metric] = getattr(self, metric)(**metric_kws)
+        # as in `compute_class_metrics_df`, check the metric names beforehand
+        inexistent_metrics = [
+            metric for metric in metrics
+            if metric not in self.LANDSCAPE_METRICS
+        ]
+        if inexistent_metrics:
+            raise ValueError(
+                "{metrics} are not among {landscape_metrics}".format(
+                    metrics=inexistent_metrics,
+                    landscape_metrics=self.LANDSCAPE_METRICS))
+
+        metrics_dict = {}
+        for metric in metrics:
+            if metric in metrics_kws:
+                metric_kws = metrics_kws[metric]
+            else:
+                metric_kws = {}
 
-        except AttributeError:
-            raise ValueError("{metric} is not among {metrics}".format(
-                metric=metric, metrics=Landscape.LANDSCAPE_METRICS))
+            metrics_dict[metric] = self._get_cached(
+                lambda: getattr(self, metric)(**metric_kws), 'landscape',
+                metric, metric_kws)
+        self._apply_cache_policy()
 
         return pd.DataFrame(metrics_dict, index=[0])
 
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio import windows
+
+from .cache import MetricsCache
+from .landscape import Landscape, _compute_classes, _memmap_band
+from .profiling import _instrument
+
+__all__ = ['LazyLandscape']
+
+
+@_instrument
+class LazyLandscape(Landscape):
+    """Class representing a raster landscape whose pixels are only read when
+    they are first needed (e.g., to compute a metric), and that can release
+    them (see the `cache_policy` argument) once its metrics are computed, so
+    that long series of rasters can be analyzed without holding all of them
+    in memory
+    """
+
+    # the landscape array is read lazily, and released as another per-cell
+    # cached structure
+    _CACHED_PRIMITIVES = ['landscape_arr'] + Landscape._CACHED_PRIMITIVES
+    _PATCH_PRIMITIVES = ['landscape_arr'] + Landscape._PATCH_PRIMITIVES
+
+    def __init__(self, landscape, res=None, nodata=None, copy=True,
+                 cache=None, cache_policy='all', n_threads=None, **kwargs):
+        """
+        Parameters
+        ----------
+        landscape : str or pathlib.Path object
+            A filename or URL, or a Path object, that will be passed to
+            `rasterio.open`. Since the raster might be read again after
+            releasing its pixels, file objects are not supported
+        res : tuple, optional
+            The (x, y) resolution of the dataset. If not provided, it will be
+            read from the raster
+        nodata : int, optional
+            Value to be assigned to pixels with no data. If not provided, it
+            will be read from the raster
+        copy : bool, default True
+            Whether the raster should be read into memory. If False and the
+            raster is an uncompressed GeoTIFF file whose strips are stored
+            contiguously, it will be memory-mapped instead
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics and the
+            expensive intermediate structures are stored. See
+            `Landscape.__init__`
+        cache_policy : {'all', 'summaries', 'none'}, default 'all'
+            Which of the intermediate structures cached in memory are kept
+            after computing a metrics data frame. Unlike in `Landscape`, the
+            landscape array is among the released per-cell structures, i.e.,
+            with 'summaries' or 'none', the raster is read again if needed
+            afterwards
+        n_threads : int, optional
+            Number of threads used to compute the per-class primitives
+            concurrently. See `Landscape.__init__`
+        **kwargs : optional
+            Keyword arguments to be passed to `rasterio.open`
+        """
+        if cache_policy not in self._CACHE_POLICIES:
+            raise ValueError("`cache_policy` must be among {}".format(
+                self._CACHE_POLICIES))
+
+        self._landscape = landscape
+        self._rasterio_kws = dict(nodata=nodata, **kwargs)
+        self._copy = copy
+
+        # only read the metadata of the raster
+        with rasterio.open(self._landscape, **self._rasterio_kws) as src:
+            if res is None:
+                res = src.res
+            if nodata is None:
+                nodata = src.nodata
+
+        self.cell_width, self.cell_height = res
+        self.cell_area = res[0] * res[1]
+        self.nodata = nodata
+
+        if cache is not None and not isinstance(cache, MetricsCache):
+            cache = MetricsCache(cache)
+        self.metrics_cache = cache
+        self.cache_policy = cache_policy
+        self.n_threads = n_threads
+
+    @property
+    def landscape_arr(self):
+        try:
+            return self._landscape_arr
+        except AttributeError:
+            with rasterio.open(self._landscape, **self._rasterio_kws) as src:
+                landscape_arr = None if self._copy else _memmap_band(src)
+                if landscape_arr is None:
+                    landscape_arr = src.read(1)
+            self._landscape_arr = landscape_arr
+
+            return self._landscape_arr
+
+    @property
+    def classes(self):
+        try:
+            return self._classes
+        except AttributeError:
+            if '_landscape_arr' in vars(self):
+                self._classes, class_num_cells, num_cells = _compute_classes(
+                    self._landscape_arr, self.nodata)
+            else:
+                # e.g., when `MultiLandscape.__init__` gets the classes of a
+                # series of rasters, read them by blocks of rows so that the
+                # whole raster is neither held nor kept in memory. It is only
+                # read once a metric is computed
+                self._classes, class_num_cells, num_cells = \
+                    self._read_classes()
+            # as in `Landscape.__init__`, keep the cell counts
+            self._cached_class_num_cells_ser = pd.Series(
+                class_num_cells, index=self._classes, name='num_cells')
+            self._landscape_area = num_cells * self.cell_area
+
+            return self._classes
+
+    def _read_classes(self):
+        with rasterio.open(self._landscape, **self._rasterio_kws) as src:
+            landscape_arr = None if self._copy else _memmap_band(src)
+            if landscape_arr is not None:
+                return _compute_classes(landscape_arr, self.nodata)
+
+            num_block_rows = max(2**22 // max(src.width, 1), 1)
+            values, counts, num_cells = [], [], 0
+            for row in range(0, src.height, num_block_rows):
+                block_arr = src.read(
+                    1, window=windows.Window(
+                        0, row, src.width,
+                        min(num_block_rows, src.height - row)))
+                block_values, block_counts, block_num_cells = \
+                    _compute_classes(block_arr, self.nodata)
+                values.append(block_values)
+                counts.append(block_counts)
+                num_cells += block_num_cells
+
+        classes, class_i = np.unique(np.concatenate(values),
+                                     return_inverse=True)
+        class_num_cells = np.bincount(
+            class_i, weights=np.concatenate(counts),
+            minlength=len(classes)).astype(np.int64)
+
+        return classes, class_num_cells, num_cells
@@ -1,4 +1,5 @@
 import abc
+import multiprocessing
 from functools import reduce
 
 import matplotlib.pyplot as plt
@@ -6,21 +7,159 @@ import numpy as np
 import pandas as pd
 import six
 
+from .cache import MetricsCache, _compute_cache_key
 from .landscape import Landscape
+from .lazy import LazyLandscape
+from .profiling import (_add_disk_lookup, _call_profiled,
+                        _get_worker_profile, _merge_worker_records)
+
+# landscapes of the `MultiLandscape` instance, set in each worker process of
+# the pool by `_init_worker`
+_worker_landscapes = None
+
+
+def _init_worker(landscapes):
+    # with the 'fork' start method, the landscapes are inherited by the worker
+    # processes instead of being pickled (otherwise, they are pickled once per
+    # worker process rather than once per task)
+    global _worker_landscapes
+    _worker_landscapes = landscapes
+
+
+def _compute_landscape_metrics_df(landscape, method_name, method_kws,
+                                  cache_policy):
+    # compute the metrics data frame of a landscape and then release the
+    # structures cached in memory according to `cache_policy` (if any)
+    metrics_df = getattr(landscape, method_name)(**method_kws)
+    if cache_policy is not None:
+        landscape._apply_cache_policy(cache_policy)
+    return metrics_df
+
+
+def _compute_metrics_df(args):
+    i, method_name, method_kws, cache_policy, profile = args
+    return _call_profiled(profile, _compute_landscape_metrics_df,
+                          _worker_landscapes[i], method_name, method_kws,
+                          cache_policy)
+
+
+def _compute_landscapes_metrics_dfs(landscapes, method_name, method_kws,
+                                    n_jobs=None, cache=None,
+                                    cache_policy=None):
+    # compute the metrics data frame of each landscape by calling its
+    # `method_name` method, either sequentially or in a pool of processes. If
+    # an on-disk `cache` is provided, only the data frames that are not
+    # already stored in it are computed (and then stored). If `cache_policy`
+    # is provided, the structures cached in memory by each landscape are
+    # released accordingly once its data frame is computed
+    if cache is None:
+        landscape_ids = range(len(landscapes))
+    else:
+        keys = [
+            _compute_cache_key(landscape._content_key, method_name,
+                               method_kws) for landscape in landscapes
+        ]
+        metrics_dfs = []
+        for key in keys:
+            try:
+                metrics_dfs.append(cache[key])
+            except KeyError:
+                metrics_dfs.append(None)
+            _add_disk_lookup('dataframe', method_name,
+                             metrics_dfs[-1] is not None)
+        landscape_ids = [
+            i for i, metrics_df in enumerate(metrics_dfs) if metrics_df is None
+        ]
+
+    if n_jobs is None or n_jobs == 1 or len(landscape_ids) < 2:
+        computed_metrics_dfs = [
+            _compute_landscape_metrics_df(landscapes[i], method_name,
+                                          method_kws, cache_policy)
+            for i in landscape_ids
+        ]
+    else:
+        if n_jobs < 0:
+            n_jobs = max(multiprocessing.cpu_count() + 1 + n_jobs, 1)
+        pool = multiprocessing.Pool(min(n_jobs, len(landscape_ids)),
+                                    initializer=_init_worker,
+                                    initargs=(landscapes, ))
+        try:
+            # if profiling, each worker returns its records along with the
+            # data frame
+            profile = _get_worker_profile()
+            results = pool.map(_compute_metrics_df,
+                               [(i, method_name, method_kws, cache_policy,
+                                 profile) for i in landscape_ids])
+            computed_metrics_dfs = []
+            for metrics_df, records in results:
+                computed_metrics_dfs.append(metrics_df)
+                if records is not None:
+                    _merge_worker_records(records)
+        finally:
+            pool.close()
+            pool.join()
+
+    if cache is None:
+        return computed_metrics_dfs
+
+    for i, metrics_df in zip(landscape_ids, computed_metrics_dfs):
+        cache[keys[i]] = metrics_df
+        metrics_dfs[i] = metrics_df
+
+    return metrics_dfs
+
+
+class _LazyLandscapes(object):
+    # sequence of landscapes that are only instantiated (and then kept) when
+    # they are accessed for the first time. Children classes must implement
+    # `_get_landscape`
+    def __init__(self, num_landscapes):
+        self._num_landscapes = num_landscapes
+        self._landscapes = {}
+
+    def __len__(self):
+        return self._num_landscapes
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._num_landscapes
+        if not 0 <= i < self._num_landscapes:
+            raise IndexError("landscape index out of range")
+        try:
+            return self._landscapes[i]
+        except KeyError:
+            landscape = self._get_landscape(i)
+            self._landscapes[i] = landscape
+            return landscape
+
+    def __iter__(self):
+        for i in range(self._num_landscapes):
+            yield self[i]
+
+    def _get_landscape(self, i):
+        raise NotImplementedError
+
+    @property
+    def classes(self):
+        return reduce(np.union1d,
+                      tuple(landscape.classes for landscape in self))
 
 
 @six.add_metaclass(abc.ABCMeta)
 class MultiLandscape:
     @abc.abstractmethod
     def __init__(self, landscapes, feature_name, feature_values, metrics=None,
-                 classes=None, metrics_kws={}):
+                 classes=None, metrics_kws={}, n_jobs=None, cache=None,
+                 cache_policy=None):
         """
         Parameters
         ----------
         landscapes : list-like
             A list-like of `Landscape` objects or of strings/file objects/
             pathlib.Path objects so that each is passed as the `landscape`
-            argument of `Landscape.__init__`
+            argument of `Landscape.__init__` (or `LazyLandscape.__init__` for
+            strings and pathlib.Path objects, which are then only read when
+            their metrics are computed)
         feature_name : str
             Name of the feature that will distinguish each landscape
         feature_values : list-like
@@ -38,11 +177,43 @@ class MultiLandscape:
             string 'total_edge' (method name) to {'count_boundary': False}.
             The default empty dictionary will compute each metric according to
             FRAGSTATS defaults.
+        n_jobs : int, optional
+            Number of worker processes used to compute the metrics of the
+            landscapes in parallel. If -1, all the CPUs are used; for lower
+            negative values, (`n_cpus + 1 + n_jobs`) are used. If None or 1,
+            the metrics are computed sequentially
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics data
+            frames of each landscape are stored, keyed by the content of the
+            landscape, so that they are not recomputed for identical
+            landscapes in later sessions. If None, nothing is stored on disk
+        cache_policy : {'all', 'summaries', 'none'}, optional
+            Which of the intermediate structures cached in memory by each
+            landscape are kept once its metrics data frame is computed (see
+            the `cache_policy` argument of `Landscape`), e.g., 'summaries'
+            releases the per-cell and per-patch structures of each landscape
+            so that they are not held until all the landscapes are computed
+            (for the landscapes provided as paths, this includes their
+            pixels, so that only one raster is held in memory at a time). If
+            None, the policy of each landscape is used
         """
-        if isinstance(landscapes[0], Landscape):
+        if cache_policy is not None and \
+           cache_policy not in Landscape._CACHE_POLICIES:
+            raise ValueError("`cache_policy` must be among {}".format(
+                Landscape._CACHE_POLICIES))
+
+        if isinstance(landscapes, _LazyLandscapes) or isinstance(
+                landscapes[0], Landscape):
             self.landscapes = landscapes
         else:
-            self.landscapes = list(map(Landscape, landscapes))
+            # the landscapes that are provided as paths are only read when
+            # needed, and then released according to `cache_policy`, so that
+            # they are not all held in memory at once
+            self.landscapes = [
+                Landscape(landscape) if hasattr(landscape, 'read') else
+                LazyLandscape(landscape, cache_policy=cache_policy or 'all')
+                for landscape in landscapes
+            ]
 
         if len(self.landscapes) != len(feature_values):
             raise ValueError(
@@ -79,9 +250,14 @@ class MultiLandscape:
                 self.landscape_metrics = np.intersect1d(
                     metrics, Landscape.LANDSCAPE_METRICS)
 
-        present_classes = reduce(
-            np.union1d,
-            tuple(landscape.classes for landscape in self.landscapes))
+        if isinstance(self.landscapes, _LazyLandscapes):
+            # lazy sequences might get the present classes without
+            # instantiating the landscapes
+            present_classes = self.landscapes.classes
+        else:
+            present_classes = reduce(
+                np.union1d,
+                tuple(landscape.classes for landscape in self.landscapes))
         if classes is None:
             self.classes = present_classes
         else:
@@ -95,37 +271,52 @@ class MultiLandscape:
                 self.classes = classes
 
         self.metrics_kws = metrics_kws
+        self.n_jobs = n_jobs
+        if cache is not None and not isinstance(cache, MetricsCache):
+            cache = MetricsCache(cache)
+        self.metrics_cache = cache
+        self.cache_policy = cache_policy
 
     def __len__(self):
         return len(self.landscapes)
 
+    def _compute_metrics_dfs(self, method_name, method_kws):
+        return _compute_landscapes_metrics_dfs(self.landscapes, method_name,
+                                               method_kws, self.n_jobs,
+                                               self.metrics_cache,
+                                               self.cache_policy)
+
     @property
     def class_metrics_df(self):
         try:
             return self._class_metrics_df
         except AttributeError:
             feature_values = getattr(self, self.feature_name)
+
+            # get the class metrics DataFrame for the landscape that
+            # corresponds to each feature value
+            dfs = self._compute_metrics_dfs(
+                'compute_class_metrics_df', {
+                    'metrics': self.class_metrics,
+                    'metrics_kws': self.metrics_kws
+                })
+            # assemble the data frame in bulk from a float array of shape
+            # (num_classes, num_feature_values, num_metrics), where each
+            # landscape's data frame is reindexed to the classes considered in
+            # this instance (classes that are not present in a landscape are
+            # thus NaN)
+            metrics_arr = np.stack([
+                df.reindex(index=self.classes,
+                           columns=self.class_metrics).values.astype(
+                               np.float64) for df in dfs
+            ], axis=1)
             # TODO: one-level index if only one class?
             class_metrics_df = pd.DataFrame(
+                metrics_arr.reshape(-1, len(self.class_metrics)),
                 index=pd.MultiIndex.from_product(
-                    [self.classes, feature_values]),
-                columns=self.class_metrics)
-            class_metrics_df.index.names = 'class_val', self.feature_name
-            class_metrics_df.columns.name = 'metric'
-
-            for feature_value, landscape in zip(feature_values,
-                                                self.landscapes):
-                # get the class metrics DataFrame for the landscape that
-                # corresponds to this feature value
-                df = landscape.compute_class_metrics_df(
-                    metrics=self.class_metrics, metrics_kws=self.metrics_kws)
-                # filter so we only check the classes considered in this
-                # instance
-                df = df.loc[df.index.intersection(self.classes)]
-                # put every row of the filtered DataFrame of this particular
-                # feature value
-                for class_val, row in df.iterrows():
-                    class_metrics_df.loc[class_val, feature_value] = row
+                    [self.classes, feature_values],
+                    names=['class_val', self.feature_name]),
+                columns=pd.Index(self.class_metrics, name='metric'))
 
             self._class_metrics_df = class_metrics_df
 
@@ -137,22 +328,61 @@ class MultiLandscape:
             return self._landscape_metrics_df
         except AttributeError:
             feature_values = getattr(self, self.feature_name)
-            landscape_metrics_df = pd.DataFrame(index=feature_values,
-                                                columns=self.landscape_metrics)
-            landscape_metrics_df.index.name = self.feature_name
-            landscape_metrics_df.columns.name = 'metric'
-
-            for feature_value, landscape in zip(feature_values,
-                                                self.landscapes):
-                landscape_metrics_df.loc[
-                    feature_value] = landscape.compute_landscape_metrics_df(
-                        self.landscape_metrics,
-                        metrics_kws=self.metrics_kws).iloc[0]
+
+            dfs = self._compute_metrics_dfs(
+                'compute_landscape_metrics_df', {
+                    'metrics': self.landscape_metrics,
+                    'metrics_kws': self.metrics_kws
+                })
+            # assemble the data frame in bulk from a float array of shape
+            # (num_feature_values, num_metrics)
+            landscape_metrics_df = pd.DataFrame(
+                np.array([
+                    df.reindex(columns=self.landscape_metrics).values[0]
+                    for df in dfs
+                ], dtype=np.float64).reshape(len(dfs),
+                                             len(self.landscape_metrics)),
+                index=pd.Index(feature_values, name=self.feature_name),
+                columns=pd.Index(self.landscape_metrics, name='metric'))
 
             self._landscape_metrics_df = landscape_metrics_df
 
             return self._landscape_metrics_df
 
+    def compute_tidy_metrics_df(self, level='landscape'):
+        """
+        Returns the metrics in long format ("tidy"), i.e., a data frame with
+        a row for each observation (landscape and class if `level` is 'class'
+        and metric)
+
+        Parameters
+        ----------
+        level : {'landscape', 'class'}, default 'landscape'
+            Whether to return the landscape-level metrics (from
+            `landscape_metrics_df`) or the class-level metrics (from
+            `class_metrics_df`)
+
+        Returns
+        -------
+        df : pd.DataFrame
+            Dataframe with the columns of the index of the respective wide
+            data frame (i.e., the feature name, preceded by 'class_val' for
+            class-level metrics), followed by the 'metric' and 'value'
+            columns
+        """
+
+        if level == 'landscape':
+            metrics_df = self.landscape_metrics_df
+        elif level == 'class':
+            metrics_df = self.class_metrics_df
+        else:
+            raise ValueError(
+                "`level` must be either 'landscape' or 'class'")
+
+        return metrics_df.reset_index().melt(
+            id_vars=list(metrics_df.index.names), var_name='metric',
+            value_name='value')
+
     def plot_metric(self, metric, class_val=None, ax=None, metric_legend=True,
                     fmt='--o', plot_kws={}, subplots_kws={}):
         """
@@ -0,0 +1,302 @@
+import sys
+import time
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+__all__ = ['MetricsProfiler']
+
+# profilers whose context is currently active
+_active_profilers = []
+# stack with the traced memory (in bytes) at the start of each of the ongoing
+# profiled calls and the peak traced memory reached so far within it
+_memory_frames = []
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+_RECORD_COLUMNS = [
+    'calls', 'time', 'self_time', 'hits', 'misses', 'disk_hits',
+    'disk_misses', 'peak_memory', 'cached_size'
+]
+# columns that are aggregated by taking the maximum rather than the sum
+_MAX_COLUMNS = ['peak_memory', 'cached_size']
+_MEMORY_COLUMNS = ['peak_memory', 'cached_size']
+
+# methods that compute the metrics data frames of a landscape
+_DF_METHODS = [
+    'compute_patch_metrics_df', 'compute_class_metrics_df',
+    'compute_landscape_metrics_df'
+]
+
+
+class MetricsProfiler(object):
+    """Context manager that records, for each metric method, metrics data
+    frame method and cached primitive (e.g., the label array or the adjacency
+    table) of the landscapes that are computed within its context, the
+    number of calls, the wall time, the cache hits and misses and optionally
+    the peak memory
+    """
+
+    def __init__(self, callback=None, memory=False):
+        """
+        Parameters
+        ----------
+        callback : callable, optional
+            Function that is called with a dict describing each recorded
+            event, with the keys 'kind' (either 'metric', 'dataframe' or
+            'primitive'), 'name', 'time', 'self_time' and 'hit' (whether a
+            cached primitive was already computed, None for methods), plus
+            'peak_memory' and 'cached_size' if `memory` is True
+        memory : bool, default False
+            Whether the memory is also recorded (with `tracemalloc`), i.e.,
+            the peak of the memory allocated during each call (in bytes,
+            relative to the memory allocated at its start) and the size of
+            each cached primitive (in bytes). Tracing the memory allocations
+            considerably slows down the computations, and requires Python 3.9
+            or above
+        """
+        if memory and not hasattr(tracemalloc, 'reset_peak'):
+            raise ValueError(
+                'Recording the memory requires Python 3.9 or above')
+        self.callback = callback
+        self.memory = memory
+        self._records = {}
+        # stack with the time spent in the profiled calls nested within each
+        # of the ongoing profiled calls
+        self._children_times = []
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        else:
+            self._started_tracing = False
+        _active_profilers.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_profilers.remove(self)
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def _get_record(self, kind, name):
+        try:
+            return self._records[kind, name]
+        except KeyError:
+            record = dict.fromkeys(_RECORD_COLUMNS, 0)
+            self._records[kind, name] = record
+            return record
+
+    def _start_call(self):
+        self._children_times.append(0.)
+
+    def _end_call(self, kind, name, elapsed, hit=None, peak_memory=None,
+                  cached_size=None):
+        self_time = elapsed - self._children_times.pop()
+        if self._children_times:
+            self._children_times[-1] += elapsed
+
+        record = self._get_record(kind, name)
+        record['calls'] += 1
+        record['time'] += elapsed
+        record['self_time'] += self_time
+        if hit is not None:
+            record['hits' if hit else 'misses'] += 1
+        if self.memory:
+            record['peak_memory'] = max(record['peak_memory'], peak_memory)
+            if cached_size is not None:
+                record['cached_size'] = max(record['cached_size'],
+                                            cached_size)
+
+        if self.callback is not None:
+            event = dict(kind=kind, name=name, time=elapsed,
+                         self_time=self_time, hit=hit)
+            if self.memory:
+                event.update(peak_memory=peak_memory, cached_size=cached_size)
+            self.callback(event)
+
+    def _add_disk_lookup(self, kind, name, hit):
+        self._get_record(kind, name)['disk_hits' if hit else 'disk_misses'] \
+            += 1
+
+    def _merge_records(self, records):
+        # add the records of another profiler, e.g., from a worker process
+        for key, other_record in records.items():
+            record = self._get_record(*key)
+            for column in _RECORD_COLUMNS:
+                if column in _MAX_COLUMNS:
+                    record[column] = max(record[column], other_record[column])
+                else:
+                    record[column] += other_record[column]
+
+    @property
+    def records_df(self):
+        """Data frame with the records (columns) of each kind of profiled
+        call and name (index). The 'peak_memory' and 'cached_size' columns
+        (the latter only applies to the primitives) are the maximum among
+        the calls and are only included if `memory` is True"""
+        if self.memory:
+            columns = _RECORD_COLUMNS
+        else:
+            columns = [
+                column for column in _RECORD_COLUMNS
+                if column not in _MEMORY_COLUMNS
+            ]
+        records_df = pd.DataFrame.from_dict(self._records, orient='index',
+                                            columns=columns)
+        records_df.index = pd.MultiIndex.from_tuples(
+            list(self._records.keys()), names=['kind', 'name'])
+        return records_df.sort_index()
+
+
+def _add_disk_lookup(kind, name, hit):
+    for profiler in _active_profilers:
+        profiler._add_disk_lookup(kind, name, hit)
+
+
+def _get_worker_profile():
+    # whether the worker processes must profile their calls (None if there
+    # are no active profilers, otherwise whether the memory is recorded), to
+    # be passed to `_call_profiled`
+    if not _active_profilers:
+        return None
+    return any(profiler.memory for profiler in _active_profilers)
+
+
+def _call_profiled(profile, func, *args):
+    # call `func` in a worker process, returning its result along with the
+    # records of a profiler if `profile` is not None (see
+    # `_get_worker_profile`), so that they can be merged into the active
+    # profilers of the parent process (see `_merge_worker_records`)
+    if profile is None:
+        return func(*args), None
+
+    # with the 'fork' start method, the worker process inherits copies of the
+    # profilers of the parent process, whose records would be lost
+    del _active_profilers[:]
+    del _memory_frames[:]
+    with MetricsProfiler(memory=profile) as profiler:
+        result = func(*args)
+
+    return result, profiler._records
+
+
+def _merge_worker_records(records):
+    for profiler in _active_profilers:
+        profiler._merge_records(records)
+
+
+def _get_nbytes(obj):
+    # approximate size (in bytes) of a cached structure
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    elif isinstance(obj, (pd.Series, pd.DataFrame)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    elif isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            _get_nbytes(key) + _get_nbytes(value)
+            for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_get_nbytes(value) for value in obj)
+    else:
+        return sys.getsizeof(obj)
+
+
+def _start_memory_frame():
+    current, peak = tracemalloc.get_traced_memory()
+    if _memory_frames:
+        # keep the peak reached so far within the ongoing (outer) call, since
+        # the peak of `tracemalloc` is reset below
+        _memory_frames[-1][1] = max(_memory_frames[-1][1], peak)
+    tracemalloc.reset_peak()
+    _memory_frames.append([current, current])
+
+
+def _end_memory_frame():
+    # returns the peak memory within the call relative to its start
+    _, peak = tracemalloc.get_traced_memory()
+    start, frame_peak = _memory_frames.pop()
+    frame_peak = max(frame_peak, peak)
+    if _memory_frames:
+        _memory_frames[-1][1] = max(_memory_frames[-1][1], frame_peak)
+    tracemalloc.reset_peak()
+    return frame_peak - start
+
+
+def _profile(kind, name, func, cached_attr=None):
+    # wrap `func` so that its calls are recorded by the active profilers. If
+    # `cached_attr` is provided, the calls where the instance already has
+    # such attribute are recorded as cache hits
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if not _active_profilers:
+            return func(self, *args, **kwargs)
+
+        if cached_attr is None:
+            hit = None
+        else:
+            hit = cached_attr in vars(self)
+        profilers = list(_active_profilers)
+        memory = any(profiler.memory for profiler in profilers)
+        for profiler in profilers:
+            profiler._start_call()
+        if memory:
+            _start_memory_frame()
+        start = _timer()
+        result = None
+        try:
+            result = func(self, *args, **kwargs)
+        finally:
+            elapsed = _timer() - start
+            if memory:
+                peak_memory = _end_memory_frame()
+                if cached_attr is not None and result is not None:
+                    cached_size = _get_nbytes(result)
+                else:
+                    cached_size = None
+            else:
+                peak_memory = cached_size = None
+            for profiler in profilers:
+                profiler._end_call(kind, name, elapsed, hit, peak_memory,
+                                   cached_size)
+
+        return result
+
+    return wrapper
+
+
+def _get_cached_attr(primitive):
+    # name of the attribute where a cached primitive is stored, i.e.,
+    # `_cached_label_arr` for `_label_arr` and `_landscape_area` for
+    # `landscape_area`
+    if primitive.startswith('_'):
+        return '_cached' + primitive
+    else:
+        return '_' + primitive
+
+
+def _instrument(cls):
+    # class decorator that wraps the metric methods, metrics data frame
+    # methods and cached primitives (properties) defined in `cls` so that
+    # they are recorded by the active profilers
+    metrics = set(cls.PATCH_METRICS + cls.CLASS_METRICS +
+                  cls.LANDSCAPE_METRICS)
+    for name, attr in list(vars(cls).items()):
+        if name in cls._CACHED_PRIMITIVES and isinstance(attr, property):
+            setattr(
+                cls, name,
+                property(
+                    _profile('primitive', name, attr.fget,
+                             _get_cached_attr(name)), doc=attr.__doc__))
+        elif name in metrics:
+            setattr(cls, name, _profile('metric', name, attr))
+        elif name in _DF_METHODS:
+            setattr(cls, name, _profile('dataframe', name, attr))
+
+    return cls
@@ -1,23 +1,29 @@
+from functools import reduce
+
 import matplotlib.pyplot as plt
 import numpy as np
 
-from .gradient import BufferAnalysis
+from .cache import MetricsCache, _compute_cache_key
+from .gradient import BufferAnalysis, _read_landscape_window
 from .landscape import Landscape
-from .multilandscape import MultiLandscape
+from .multilandscape import (MultiLandscape, _LazyLandscapes,
+                             _compute_landscapes_metrics_dfs)
 
 __all__ = ['SpatioTemporalAnalysis', 'SpatioTemporalBufferAnalysis']
 
 
 class SpatioTemporalAnalysis(MultiLandscape):
     def __init__(self, landscapes, metrics=None, classes=None, dates=None,
-                 metrics_kws={}):
+                 metrics_kws={}, n_jobs=None, cache=None, cache_policy=None):
         """
         Parameters
         ----------
         landscapes : list-like
             A list-like of `Landscape` objects or of strings/file objects/
             pathlib.Path objects so that each is passed as the `landscape`
-            argument of `Landscape.__init__`
+            argument of `Landscape.__init__` (or `LazyLandscape.__init__` for
+            strings and pathlib.Path objects, which are then only read when
+            their metrics are computed)
         metrics : list-like, optional
             A list-like of strings with the names of the metrics that should
             be computed in the context of this analysis case
@@ -34,6 +40,20 @@ class SpatioTemporalAnalysis(MultiLandscape):
             string 'total_edge' (method name) to {'count_boundary': False}.
             The default empty dictionary will compute each metric according to
             FRAGSTATS defaults.
+        n_jobs : int, optional
+            Number of worker processes used to compute the metrics of the
+            landscapes in parallel. If -1, all the CPUs are used. If None or
+            1, the metrics are computed sequentially
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics data
+            frames of each landscape are stored, keyed by the content of the
+            landscape, so that they are not recomputed for identical
+            landscapes in later sessions. If None, nothing is stored on disk
+        cache_policy : {'all', 'summaries', 'none'}, optional
+            Which of the intermediate structures cached in memory by each
+            landscape are kept once its metrics data frame is computed (see
+            the `cache_policy` argument of `Landscape`). If None, the policy
+            of each landscape is used
         """
 
         if dates is None:
@@ -42,7 +62,9 @@ class SpatioTemporalAnalysis(MultiLandscape):
         # Call the parent's init
         super(SpatioTemporalAnalysis,
               self).__init__(landscapes, 'dates', dates, metrics=metrics,
-                             classes=classes, metrics_kws=metrics_kws)
+                             classes=classes, metrics_kws=metrics_kws,
+                             n_jobs=n_jobs, cache=cache,
+                             cache_policy=cache_policy)
 
     # def plot_patch_metric(metric):
     #     # TODO: sns distplot?
@@ -50,39 +72,261 @@ class SpatioTemporalAnalysis(MultiLandscape):
     #     ax.hist()
 
 
+class _DatesMaskedLandscapes(_LazyLandscapes):
+    # sequence of the landscapes of each date masked by the same buffer, i.e.,
+    # the `mask_i`-th landscape of the masked landscapes of each date
+    def __init__(self, dates_masked_landscapes, mask_i):
+        super(_DatesMaskedLandscapes,
+              self).__init__(len(dates_masked_landscapes))
+        self._dates_masked_landscapes = dates_masked_landscapes
+        self._mask_i = mask_i
+
+    def _get_landscape(self, i):
+        return self._dates_masked_landscapes[i][self._mask_i]
+
+    @property
+    def classes(self):
+        return reduce(
+            np.union1d,
+            tuple(
+                masked_landscapes.get_mask_classes(self._mask_i)
+                for masked_landscapes in self._dates_masked_landscapes))
+
+
+class _GridLandscapes(_LazyLandscapes):
+    # flat (date-major) sequence of the date x buffer grid of landscapes, so
+    # that the landscapes of a date, which share their masked primitives, are
+    # contiguous
+    def __init__(self, dates_masked_landscapes):
+        self._num_masks = len(dates_masked_landscapes[0])
+        super(_GridLandscapes,
+              self).__init__(len(dates_masked_landscapes) * self._num_masks)
+        self._dates_masked_landscapes = dates_masked_landscapes
+
+    def _get_landscape(self, i):
+        date_i, mask_i = divmod(i, self._num_masks)
+        return self._dates_masked_landscapes[date_i][mask_i]
+
+
+class _BufferSpatioTemporalAnalysis(SpatioTemporalAnalysis):
+    # spatio-temporal analysis of a single buffer of a
+    # `SpatioTemporalBufferAnalysis`, whose metrics data frames are computed
+    # for the whole date x buffer grid at once
+    def __init__(self, stba, buffer_i, *args, **kwargs):
+        self._stba = stba
+        self._buffer_i = buffer_i
+        super(_BufferSpatioTemporalAnalysis, self).__init__(*args, **kwargs)
+
+    def _compute_metrics_dfs(self, method_name, method_kws):
+        return self._stba._get_grid_metrics_dfs(method_name,
+                                                method_kws)[self._buffer_i]
+
+
 class SpatioTemporalBufferAnalysis(SpatioTemporalAnalysis):
     def __init__(self, landscapes, base_mask, buffer_dists, buffer_rings=False,
                  base_mask_crs=None, landscape_crs=None,
                  landscape_transform=None, metrics=None, classes=None,
-                 dates=None, metrics_kws={}):
-        super(SpatioTemporalBufferAnalysis, self).__init__(
-            landscapes, metrics=metrics, classes=classes, dates=dates,
-            metrics_kws=metrics_kws)
+                 dates=None, metrics_kws={}, n_jobs=None, cache=None,
+                 cache_policy=None):
+        """
+        Parameters
+        ----------
+        landscapes : list-like
+            A list-like of `Landscape` objects or of strings/file objects/
+            pathlib.Path objects so that each is passed as the `landscape`
+            argument of `Landscape.__init__`. In the latter case, only the
+            window of each raster that covers the largest buffer is read for
+            the buffers, whereas the full rasters are only read if the data
+            frames of the whole landscapes (inherited from
+            `SpatioTemporalAnalysis`) are required
+        base_mask : shapely geometry or geopandas GeoSeries
+            Geometry that will serve as a base mask to buffer around
+        buffer_dists : list-like
+            Buffer distances
+        buffer_rings : bool, default False
+            If `False`, each buffer zone will consist of the whole region that
+            lies within the respective buffer distance around the base mask.
+            If `True`, buffer zones will take the form of rings around the
+            base mask.
+        base_mask_crs : dict, optional
+            The coordinate reference system of the base mask. Required if the
+            base mask is a shapely geometry or a geopandas GeoSeries without
+            the `crs` attribute set
+        landscape_crs : dict, optional
+            The coordinate reference system of the landscapes. Required if the
+            passed-in landscapes are `Landscape` objects, ignored if they are
+            paths to GeoTiff rasters that already contain such information.
+        landscape_transform : affine.Affine
+            Transformation from pixel coordinates to coordinate reference
+            system. Required if the passed-in landscapes are `Landscape`
+            objects, ignored if they are paths to GeoTiff rasters that already
+            contain such information.
+        metrics : list-like, optional
+            A list-like of strings with the names of the metrics that should
+            be computed in the context of this analysis case
+        classes : list-like, optional
+            A list-like of ints or strings with the class values that should
+            be considered in the context of this analysis case
+        dates : list-like, optional
+            A list-like of ints or strings that label the date of each
+            snapshot of `landscapes` (for DataFrame indices and plot labels)
+        metrics_kws : dict, optional
+            Dictionary mapping the keyword arguments (values) that should be
+            passed to each metric method (key), e.g., to exclude the boundary
+            from the computation of `total_edge`, metric_kws should map the
+            string 'total_edge' (method name) to {'count_boundary': False}.
+            The default empty dictionary will compute each metric according to
+            FRAGSTATS defaults.
+        n_jobs : int, optional
+            Number of worker processes used to compute the metrics of the
+            date x buffer grid of landscapes in parallel. If -1, all the CPUs
+            are used. If None or 1, the metrics are computed sequentially
+        cache : `MetricsCache` or str, optional
+            On-disk cache (or path to its directory) where the metrics data
+            frames of each landscape are stored, keyed by the content of the
+            landscape, so that they are not recomputed for identical
+            landscapes in later sessions. If None, nothing is stored on disk
+        cache_policy : {'all', 'summaries', 'none'}, optional
+            Which of the intermediate structures cached in memory by each
+            landscape are kept once its metrics data frame is computed (see
+            the `cache_policy` argument of `Landscape`). If None, the policy
+            of each landscape is used
+        """
+
+        if cache_policy is not None and \
+           cache_policy not in Landscape._CACHE_POLICIES:
+            raise ValueError("`cache_policy` must be among {}".format(
+                Landscape._CACHE_POLICIES))
+        if dates is None:
+            dates = ['t{}'.format(i) for i in range(len(landscapes))]
+        if cache is not None and not isinstance(cache, MetricsCache):
+            cache = MetricsCache(cache)
+
+        # the buffer masks are obtained once (from the first date) and
+        # shared by all the dates
         ba = BufferAnalysis(
             landscapes[0], base_mask=base_mask, buffer_dists=buffer_dists,
             buffer_rings=buffer_rings, base_mask_crs=base_mask_crs,
             landscape_crs=landscape_crs,
             landscape_transform=landscape_transform, metrics=metrics,
             classes=classes, metrics_kws=metrics_kws)
+        if ba.landscape_window is not None:
+            # the landscapes are raster files, so only read the window that
+            # covers the largest buffer (the same for all dates, since the
+            # buffer masks are shared)
+            window_landscapes = [ba.landscapes._landscape] + [
+                _read_landscape_window(
+                    landscape, ba.landscape_window.toslices())[0]
+                for landscape in landscapes[1:]
+            ]
+        else:
+            landscapes = [ba.landscapes._landscape] + [
+                landscape if isinstance(landscape, Landscape) else
+                Landscape(landscape) for landscape in landscapes[1:]
+            ]
+            window_landscapes = landscapes
+
+        # the state inherited from `SpatioTemporalAnalysis` that covers the
+        # full extent of the landscapes (i.e., the landscapes, their classes
+        # and their data frames) is only initialized if it is required (see
+        # `_full_extent_sta`), so that the buffer grid never reads more than
+        # the window of the largest buffer. The rest of the attributes set by
+        # `MultiLandscape.__init__` are set here
+        self._full_extent_args = (landscapes,
+                                  dict(metrics=metrics, classes=classes,
+                                       dates=dates, metrics_kws=metrics_kws,
+                                       n_jobs=n_jobs, cache=cache,
+                                       cache_policy=cache_policy))
+        self.dates = dates
+        self.feature_name = 'dates'
+        # the metrics are validated by `BufferAnalysis.__init__`
+        self.class_metrics = ba.class_metrics
+        self.landscape_metrics = ba.landscape_metrics
+        self.metrics_kws = metrics_kws
+        self.n_jobs = n_jobs
+        self.metrics_cache = cache
+        self.cache_policy = cache_policy
+
         # while `BufferAnalysis.__init__` will set the `buffer_dists`
         # attribute to the instantiated object (stored in the variable `ba`),
         # it will not set it to the current `SpatioTemporalBufferAnalysis`,
         # so we need to do it here
         self.buffer_dists = ba.buffer_dists
 
-        # init the `SpatioTemporalAnalysis` objects
-        self.stas = []
-        for buffer_dist, mask_arr in zip(ba.buffer_dists, ba.masks_arr):
-            self.stas.append(
-                SpatioTemporalAnalysis([
-                    Landscape(
-                        np.where(mask_arr, landscape.landscape_arr,
-                                 landscape.nodata),
-                        res=(landscape.cell_width,
-                             landscape.cell_height), nodata=landscape.nodata)
-                    for landscape in self.landscapes
-                ], metrics=metrics, classes=classes, dates=dates,
-                                       metrics_kws=metrics_kws))
+        # mask the landscape of each date with the shared buffer masks (in
+        # the same way as `BufferAnalysis` does for the first date)
+        masked_landscapes_class = type(ba.landscapes)
+        self._dates_masked_landscapes = [ba.landscapes] + [
+            masked_landscapes_class(landscape, ba.masks_arr)
+            for landscape in window_landscapes[1:]
+        ]
+        self._grid_metrics_dfs = {}
+
+        # init the `SpatioTemporalAnalysis` objects, whose landscapes are
+        # only instantiated when their metrics are computed
+        self.stas = [
+            _BufferSpatioTemporalAnalysis(
+                self, buffer_i,
+                _DatesMaskedLandscapes(self._dates_masked_landscapes,
+                                       buffer_i), metrics=metrics,
+                classes=classes, dates=self.dates, metrics_kws=metrics_kws)
+            for buffer_i in range(len(self.buffer_dists))
+        ]
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def _full_extent_sta(self):
+        # `SpatioTemporalAnalysis` of the full extent of the landscapes, which
+        # is only instantiated (and thus, for raster files, the classes of
+        # the landscapes are only read) when first required
+        try:
+            return self._cached_full_extent_sta
+        except AttributeError:
+            landscapes, sta_kws = self._full_extent_args
+            self._cached_full_extent_sta = SpatioTemporalAnalysis(
+                landscapes, **sta_kws)
+
+            return self._cached_full_extent_sta
+
+    @property
+    def landscapes(self):
+        return self._full_extent_sta.landscapes
+
+    @property
+    def classes(self):
+        return self._full_extent_sta.classes
+
+    @property
+    def class_metrics_df(self):
+        return self._full_extent_sta.class_metrics_df
+
+    @property
+    def landscape_metrics_df(self):
+        return self._full_extent_sta.landscape_metrics_df
+
+    def _get_grid_metrics_dfs(self, method_name, method_kws):
+        # compute the metrics data frames of the whole date x buffer grid
+        # (optionally in parallel) the first time that any of the
+        # `SpatioTemporalAnalysis` objects requires them, and return them
+        # grouped by buffer. The data frames are stored by method and keyword
+        # arguments (i.e., the metrics and `metrics_kws`), which might differ
+        # among the `SpatioTemporalAnalysis` objects
+        key = _compute_cache_key(method_name, method_kws)
+        try:
+            return self._grid_metrics_dfs[key]
+        except KeyError:
+            num_buffers = len(self.buffer_dists)
+            metrics_dfs = _compute_landscapes_metrics_dfs(
+                _GridLandscapes(self._dates_masked_landscapes), method_name,
+                method_kws, self.n_jobs, self.metrics_cache, self.cache_policy)
+            grid_metrics_dfs = [
+                metrics_dfs[buffer_i::num_buffers]
+                for buffer_i in range(num_buffers)
+            ]
+            self._grid_metrics_dfs[key] = grid_metrics_dfs
+            return grid_metrics_dfs
 
     def plot_metric(self, metric, class_val=None, ax=None, metric_legend=True,
                     fmt='--o', plot_kws={}, subplots_kws={}):
@@ -0,0 +1,397 @@
+from __future__ import division
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio import windows
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from .landscape import Landscape
+from .profiling import _instrument
+
+__all__ = ['TiledLandscape']
+
+
+@_instrument
+class TiledLandscape(Landscape):
+    """Class representing a raster landscape that is read by tiles (i.e.,
+    rasterio windows) so that the landscape metrics can be computed for
+    rasters that do not fit in memory
+    """
+
+    def __init__(self, landscape, res=None, nodata=None, tile_size=1024,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        landscape : str or pathlib.Path object
+            A filename or URL, or a Path object, that will be passed to
+            `rasterio.open`. Since the raster is read again for each pass over
+            its tiles, file objects are not supported
+        res : tuple, optional
+            The (x, y) resolution of the dataset. If not provided, it will be
+            read from the raster
+        nodata : int, optional
+            Value to be assigned to pixels with no data. If not provided, it
+            will be read from the raster
+        tile_size : int or tuple, default 1024
+            Number of rows and columns of each tile. If an int is provided,
+            the tiles will be squares. The memory required to process each
+            tile is proportional to its size, although note that the
+            patch-level attributes (and the boundary cells of the patches in
+            the case of `euclidean_nearest_neighbor`) are held in memory for
+            the whole landscape
+        **kwargs : optional
+            Keyword arguments to be passed to `rasterio.open`
+        """
+        self._landscape = landscape
+        self._rasterio_kws = dict(nodata=nodata, **kwargs)
+        if np.isscalar(tile_size):
+            tile_size = (tile_size, tile_size)
+        self.tile_size = tuple(tile_size)
+
+        with rasterio.open(self._landscape, **self._rasterio_kws) as src:
+            if res is None:
+                res = src.res
+            if nodata is None:
+                nodata = src.nodata
+            self._shape = src.height, src.width
+            dtype = src.dtypes[0]
+
+        self.cell_width, self.cell_height = res
+        self.cell_area = res[0] * res[1]
+        self.nodata = nodata
+
+        # first pass over the tiles to get the classes and the landscape area
+        classes = np.array([], dtype=dtype)
+        landscape_num_cells = 0
+        for _, _, tile_arr in self._iter_tiles():
+            classes = np.union1d(classes, np.unique(tile_arr))
+            # NaN cells are treated as nodata (see `_compute_classes`)
+            landscape_num_cells += np.sum((tile_arr != nodata)
+                                          & ~np.isnan(tile_arr))
+        # as in `Landscape.__init__`, explicitly set the dtype of the
+        # landscape classes to ensure consistency
+        classes = np.array(classes, dtype=dtype)
+        classes = classes[classes != nodata]
+        classes = classes[~np.isnan(classes)]
+        self.classes = classes
+        self._landscape_area = landscape_num_cells * self.cell_area
+
+    @property
+    def landscape_arr(self):
+        # ACHTUNG: this reads the whole raster into memory, so it is only
+        # meant for the methods that need the full array (e.g.,
+        # `plot_landscape`). The landscape metrics are computed by tiles
+        with rasterio.open(self._landscape, **self._rasterio_kws) as src:
+            return src.read(1)
+
+    def _iter_tiles(self):
+        num_rows, num_cols = self._shape
+        tile_rows, tile_cols = self.tile_size
+        with rasterio.open(self._landscape, **self._rasterio_kws) as src:
+            for row_off in range(0, num_rows, tile_rows):
+                for col_off in range(0, num_cols, tile_cols):
+                    window = windows.Window(
+                        col_off, row_off, min(tile_cols, num_cols - col_off),
+                        min(tile_rows, num_rows - row_off))
+                    yield row_off, col_off, src.read(1, window=window)
+
+    def _iter_label_tiles(self):
+        # label each tile separately. Each patch of each tile gets a
+        # provisional label, which is offset by the number of provisional
+        # labels of the preceding tiles. Since the labeling is deterministic,
+        # iterating again over the tiles yields the same provisional labels
+        label_offset = 0
+        for row_off, col_off, tile_arr in self._iter_tiles():
+            class_i_arr = self._compute_class_i_arr(tile_arr)
+            label_arr, num_patches = self._compute_label_arr(class_i_arr)
+            yield (row_off, col_off, class_i_arr, label_arr, num_patches,
+                   label_offset)
+            label_offset += np.sum(num_patches, dtype=np.int64)
+
+    def _compute_tiled_primitives(self):
+        num_rows, num_cols = self._shape
+        num_classes = len(self.classes)
+        n = num_classes + 1
+
+        adjacency_arr = np.zeros((2, n, n), dtype=np.int64)
+        # attributes of each provisional patch, i.e., class index, number of
+        # cells, number of edges of length `cell_width` and `cell_height`
+        # (within its tile) and position of its first cell (in raster scan
+        # order). The zero label is reserved for the background
+        prov_class_i_arrs = [np.zeros(1, dtype=np.int64)]
+        prov_num_cells_arrs = [np.zeros(1, dtype=np.int64)]
+        prov_width_arrs = [np.zeros(1, dtype=np.int64)]
+        prov_height_arrs = [np.zeros(1, dtype=np.int64)]
+        prov_first_arrs = [np.zeros(1, dtype=np.int64)]
+        # provisional labels with an edge of length `cell_width`/`cell_height`
+        # across the seams between tiles
+        seam_width_label_arrs = []
+        seam_height_label_arrs = []
+        # pairs of provisional labels that are connected across the seams
+        # between tiles, i.e., that belong to the same patch
+        union_a_arrs = []
+        union_b_arrs = []
+
+        # class indices and provisional labels of the last row of the
+        # previous row of tiles (`above_*`) and of the row of tiles that is
+        # being processed (`below_*`)
+        above_class_i_arr = np.full(num_cols, num_classes)
+        above_label_arr = np.zeros(num_cols, dtype=np.int64)
+        below_class_i_arr = np.full(num_cols, num_classes)
+        below_label_arr = np.zeros(num_cols, dtype=np.int64)
+        # class indices and provisional labels of the last column of the
+        # previous tile (within the same row of tiles)
+        left_class_i_arr = left_label_arr = None
+
+        def _count_transitions(label_arr_a, label_arr_b, minlength):
+            cond = label_arr_a != label_arr_b
+            return np.bincount(label_arr_a[cond], minlength=minlength) + \
+                np.bincount(label_arr_b[cond], minlength=minlength)
+
+        for (row_off, col_off, class_i_arr, label_arr, num_patches,
+             label_offset) in self._iter_label_tiles():
+            tile_rows, tile_cols = label_arr.shape
+            tile_num_patches = np.sum(num_patches)
+            minlength = tile_num_patches + 1
+
+            # 1. attributes of the provisional patches within the tile
+            prov_class_i_arrs.append(
+                np.repeat(np.arange(num_classes), num_patches))
+            prov_num_cells_arrs.append(
+                np.bincount(label_arr.ravel(), minlength=minlength)[1:])
+            width_counts = _count_transitions(label_arr[1:, :],
+                                              label_arr[:-1, :], minlength)
+            height_counts = _count_transitions(label_arr[:, 1:],
+                                               label_arr[:, :-1], minlength)
+            # only the tile edges that lie on the landscape boundary are
+            # patch edges, the rest are seams with other tiles
+            if row_off == 0:
+                width_counts += np.bincount(label_arr[0, :],
+                                            minlength=minlength)
+                adjacency_arr[0, -1] += np.bincount(class_i_arr[0, :],
+                                                    minlength=n)
+            if row_off + tile_rows == num_rows:
+                width_counts += np.bincount(label_arr[-1, :],
+                                            minlength=minlength)
+                adjacency_arr[0, -1] += np.bincount(class_i_arr[-1, :],
+                                                    minlength=n)
+            if col_off == 0:
+                height_counts += np.bincount(label_arr[:, 0],
+                                             minlength=minlength)
+                adjacency_arr[1, -1] += np.bincount(class_i_arr[:, 0],
+                                                    minlength=n)
+            if col_off + tile_cols == num_cols:
+                height_counts += np.bincount(label_arr[:, -1],
+                                             minlength=minlength)
+                adjacency_arr[1, -1] += np.bincount(class_i_arr[:, -1],
+                                                    minlength=n)
+            prov_width_arrs.append(width_counts[1:])
+            prov_height_arrs.append(height_counts[1:])
+            # `np.unique` returns the index of the first occurrence of each
+            # label (in raster scan order within the tile)
+            _, first_i = np.unique(label_arr.ravel(), return_index=True)
+            first_i = first_i[1:] if tile_num_patches < first_i.size else \
+                first_i
+            prov_first_arrs.append(
+                (row_off + first_i // tile_cols) * num_cols + col_off +
+                first_i % tile_cols)
+
+            # 2. adjacencies within the tile
+            adjacency_arr[0] += self._count_adjacencies(
+                class_i_arr[1:, :], class_i_arr[:-1, :])
+            adjacency_arr[1] += self._count_adjacencies(
+                class_i_arr[:, 1:], class_i_arr[:, :-1])
+
+            # 3. seams with the tile above and the tile to the left. The
+            # provisional labels of the tile are offset so that they are
+            # unique over the whole landscape
+            prov_label_arr = np.where(label_arr > 0,
+                                      label_arr + label_offset, 0)
+            if row_off > 0:
+                # the tile above might span other columns, so we use the full
+                # row of class indices/labels of the previous row of tiles
+                upper_class_i_arr = above_class_i_arr[col_off:col_off +
+                                                      tile_cols]
+                upper_label_arr = above_label_arr[col_off:col_off + tile_cols]
+                adjacency_arr[0] += self._count_adjacencies(
+                    class_i_arr[0, :], upper_class_i_arr)
+                cond = class_i_arr[0, :] != upper_class_i_arr
+                seam_width_label_arrs += [
+                    prov_label_arr[0, :][cond], upper_label_arr[cond]
+                ]
+                # cells of the same class are connected if they are adjacent
+                # in any of the eight directions
+                for d in (-1, 0, 1):
+                    start = max(col_off + d, 0)
+                    end = min(col_off + tile_cols + d, num_cols)
+                    upper_class_i_arr = above_class_i_arr[start:end]
+                    lower_class_i_arr = class_i_arr[0, start - d -
+                                                    col_off:end - d - col_off]
+                    cond = (upper_class_i_arr == lower_class_i_arr) & (
+                        upper_class_i_arr != num_classes)
+                    union_a_arrs.append(above_label_arr[start:end][cond])
+                    union_b_arrs.append(
+                        prov_label_arr[0, start - d - col_off:end - d -
+                                       col_off][cond])
+            if col_off > 0:
+                # the tile to the left spans the same rows
+                adjacency_arr[1] += self._count_adjacencies(
+                    class_i_arr[:, 0], left_class_i_arr)
+                cond = class_i_arr[:, 0] != left_class_i_arr
+                seam_height_label_arrs += [
+                    prov_label_arr[:, 0][cond], left_label_arr[cond]
+                ]
+                for d in (-1, 0, 1):
+                    start = max(d, 0)
+                    end = min(tile_rows + d, tile_rows)
+                    left_cond = (left_class_i_arr[start:end] ==
+                                 class_i_arr[start - d:end - d, 0]) & (
+                                     left_class_i_arr[start:end] !=
+                                     num_classes)
+                    union_a_arrs.append(left_label_arr[start:end][left_cond])
+                    union_b_arrs.append(
+                        prov_label_arr[start - d:end - d, 0][left_cond])
+
+            # 4. keep the last column of the tile for the seam with the next
+            # tile to the right, and the last row of the tile for the seam
+            # with the next row of tiles
+            left_class_i_arr = class_i_arr[:, -1]
+            left_label_arr = prov_label_arr[:, -1]
+            below_class_i_arr[col_off:col_off +
+                              tile_cols] = class_i_arr[-1, :]
+            below_label_arr[col_off:col_off +
+                            tile_cols] = prov_label_arr[-1, :]
+            if col_off + tile_cols == num_cols:
+                above_class_i_arr, below_class_i_arr = \
+                    below_class_i_arr, above_class_i_arr
+                above_label_arr, below_label_arr = \
+                    below_label_arr, above_label_arr
+
+        prov_class_i = np.concatenate(prov_class_i_arrs)
+        prov_num_cells = np.concatenate(prov_num_cells_arrs)
+        prov_first = np.concatenate(prov_first_arrs)
+        num_prov = len(prov_class_i)
+        prov_width = np.concatenate(prov_width_arrs) + np.bincount(
+            np.concatenate(seam_width_label_arrs + [np.zeros(0, dtype=int)]),
+            minlength=num_prov)
+        prov_height = np.concatenate(prov_height_arrs) + np.bincount(
+            np.concatenate(seam_height_label_arrs + [np.zeros(0, dtype=int)]),
+            minlength=num_prov)
+
+        # merge the provisional patches that are connected across the seams
+        # by means of the connected components of the graph of provisional
+        # labels (i.e., a union-find of the provisional labels)
+        union_a = np.concatenate(union_a_arrs + [np.zeros(0, dtype=int)])
+        union_b = np.concatenate(union_b_arrs + [np.zeros(0, dtype=int)])
+        _, component = csgraph.connected_components(
+            sparse.coo_matrix((np.ones(len(union_a), dtype=np.int8),
+                               (union_a, union_b)),
+                              shape=(num_prov, num_prov)), directed=False)
+        # drop the background label and enumerate the patches from zero
+        _, component = np.unique(component[1:], return_inverse=True)
+        num_patches = component.max() + 1 if component.size > 0 else 0
+        patch_class_i = np.zeros(num_patches, dtype=np.int64)
+        patch_class_i[component] = prov_class_i[1:]
+        patch_first = np.full(num_patches, np.iinfo(np.int64).max)
+        np.minimum.at(patch_first, component, prov_first[1:])
+
+        # sort the patches by class and then by the position of their first
+        # cell, i.e., as in `ndimage.label` for the whole landscape
+        order = np.lexsort((patch_first, patch_class_i))
+        patch_ids = np.empty(num_patches, dtype=np.int64)
+        patch_ids[order] = np.arange(num_patches)
+        patch_ids = patch_ids[component]
+
+        def _patch_sum(prov_arr):
+            return np.bincount(patch_ids, weights=prov_arr[1:],
+                               minlength=num_patches)
+
+        self._cached_num_patches_dict = dict(
+            zip(self.classes,
+                np.bincount(patch_class_i, minlength=num_classes)))
+        self._cached_patch_area_ser = pd.Series(
+            _patch_sum(prov_num_cells) * self.cell_area, name='area')
+        self._cached_patch_perimeter_ser = pd.Series(
+            _patch_sum(prov_width) * self.cell_width +
+            _patch_sum(prov_height) * self.cell_height, name='perimeter')
+        # as in `Landscape._directional_adjacency_arr`
+        self._cached_directional_adjacency_arr = \
+            adjacency_arr + np.transpose(adjacency_arr, (0, 2, 1))
+        # landscape-wide label (starting by 1) of each provisional label, to
+        # be used in `_patch_euclidean_nearest_neighbor_ser`
+        self._prov_patch_labels = np.concatenate([[0], patch_ids + 1])
+
+    # properties
+
+    @property
+    def _num_patches_dict(self):
+        try:
+            return self._cached_num_patches_dict
+        except AttributeError:
+            self._compute_tiled_primitives()
+
+            return self._cached_num_patches_dict
+
+    @property
+    def _patch_area_ser(self):
+        try:
+            return self._cached_patch_area_ser
+        except AttributeError:
+            self._compute_tiled_primitives()
+
+            return self._cached_patch_area_ser
+
+    @property
+    def _patch_perimeter_ser(self):
+        try:
+            return self._cached_patch_perimeter_ser
+        except AttributeError:
+            self._compute_tiled_primitives()
+
+            return self._cached_patch_perimeter_ser
+
+    @property
+    def _directional_adjacency_arr(self):
+        try:
+            return self._cached_directional_adjacency_arr
+        except AttributeError:
+            self._compute_tiled_primitives()
+
+            return self._cached_directional_adjacency_arr
+
+    @property
+    def _patch_euclidean_nearest_neighbor_ser(self):
+        try:
+            return self._cached_patch_euclidean_nearest_neighbor_ser
+        except AttributeError:
+            # ensure that the provisional labels have been resolved
+            self._num_patches_dict
+
+            # second pass over the tiles to get the boundary cells of the
+            # patches with their landscape-wide labels
+            row_arrs, col_arrs, label_arrs = [], [], []
+            for (row_off, col_off, _, label_arr, _,
+                 label_offset) in self._iter_label_tiles():
+                boundary_cond = self._compute_boundary_cond(label_arr)
+                # the cells at the edges of the tile might be at the boundary
+                # of their patch (depending on the neighboring tiles), so we
+                # consider them as boundary cells too
+                boundary_cond[[0, -1], :] = True
+                boundary_cond[:, [0, -1]] = True
+                boundary_cond &= label_arr != 0
+                rows, cols = np.nonzero(boundary_cond)
+                row_arrs.append(rows + row_off)
+                col_arrs.append(cols + col_off)
+                label_arrs.append(self._prov_patch_labels[
+                    label_arr[rows, cols] + label_offset])
+
+            self._cached_patch_euclidean_nearest_neighbor_ser = pd.Series(
+                self._compute_patch_euclidean_nearest_neighbor_arr(
+                    np.concatenate(row_arrs), np.concatenate(col_arrs),
+                    np.concatenate(label_arrs)),
+                name='euclidean_nearest_neighbor')
+
+            return self._cached_patch_euclidean_nearest_neighbor_ser
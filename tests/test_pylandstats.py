@@ -1,3 +1,5 @@
+import shutil
+import tempfile
 import unittest
 
 import affine
@@ -5,6 +7,8 @@ import geopandas as gpd
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+from rasterio.io import DatasetReader
+from scipy import ndimage, spatial
 from shapely import geometry
 
 import pylandstats as pls
@@ -38,6 +42,373 @@ class TestLandscape(unittest.TestCase):
         self.assertAlmostEqual(ls.cell_height, 250, delta=1)
         self.assertAlmostEqual(ls.cell_area, 250 * 250, delta=250)
 
+    def test_zero_copy(self):
+        # with `copy=False`, the landscape array must be a read-only view of
+        # the passed-in array, which must remain writeable
+        ls_arr = np.load('tests/input_data/ls250_06.npy')
+        ls = pls.Landscape(ls_arr, res=(250, 250), copy=False)
+        self.assertTrue(np.shares_memory(ls.landscape_arr, ls_arr))
+        self.assertFalse(ls.landscape_arr.flags.writeable)
+        self.assertTrue(ls_arr.flags.writeable)
+        self.assertFalse(
+            np.shares_memory(
+                pls.Landscape(ls_arr, res=(250, 250)).landscape_arr, ls_arr))
+
+        # uncompressed GeoTIFF files must be memory-mapped, and the metrics
+        # must be the same as when the raster is read into memory
+        landscape_fp = 'tests/input_data/ls250_06.tif'
+        ls = pls.Landscape(landscape_fp)
+        mmap_ls = pls.Landscape(landscape_fp, copy=False)
+        self.assertIsInstance(mmap_ls.landscape_arr, np.memmap)
+        self.assertFalse(mmap_ls.landscape_arr.flags.writeable)
+        self.assertTrue(np.all(mmap_ls.landscape_arr == ls.landscape_arr))
+        self.assertTrue(
+            np.allclose(mmap_ls.compute_class_metrics_df(),
+                        ls.compute_class_metrics_df(), equal_nan=True))
+
+    def test_classes(self):
+        # the classes and their cell counts must match `np.unique`, both for
+        # integer rasters (bincount) and float rasters with NaN values
+        ls_arr = self.ls.landscape_arr.astype(np.int32) * 1000 - 7
+        float_arr = ls_arr.astype(float)
+        float_arr[0, :3] = np.nan
+        for arr, nodata in [(ls_arr, -7), (float_arr, -7),
+                            (self.ls.landscape_arr, self.ls.nodata),
+                            (self.ls.landscape_arr, 255)]:
+            ls = pls.Landscape(arr, res=(250, 250), nodata=nodata)
+            values, counts = np.unique(arr, return_counts=True)
+            class_cond = (values != nodata) & ~np.isnan(values)
+            self.assertEqual(ls.classes.dtype, arr.dtype)
+            self.assertTrue(np.all(ls.classes == values[class_cond]))
+            self.assertTrue(
+                np.all(ls._class_num_cells_ser.values == counts[class_cond]))
+            # NaN cells are treated as nodata
+            self.assertEqual(
+                ls.landscape_area,
+                np.sum((arr != nodata) & ~np.isnan(arr)) * ls.cell_area)
+
+    def test_class_i_arr(self):
+        # the compact reclassified raster must hold the index of the class of
+        # each cell (and the extra index `len(classes)` for nodata), both for
+        # integer rasters (lookup table) and float rasters (`searchsorted`)
+        ls_arr = self.ls.landscape_arr.astype(np.int32) * 1000 - 7
+        for arr, nodata in [(ls_arr, -7), (ls_arr.astype(float), -7),
+                            (self.ls.landscape_arr, self.ls.nodata)]:
+            ls = pls.Landscape(arr, res=(250, 250), nodata=nodata)
+            class_i_arr = ls._class_i_arr
+            self.assertEqual(class_i_arr.dtype, np.uint8)
+            self.assertTrue(
+                np.all(class_i_arr[arr == nodata] == len(ls.classes)))
+            for class_i, class_val in enumerate(ls.classes):
+                self.assertTrue(
+                    np.all((class_i_arr == class_i) == (arr == class_val)))
+
+    def test_metrics_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            ls = pls.Landscape(self.ls.landscape_arr, res=(250, 250),
+                               cache=cache_dir)
+            self.assertIsInstance(ls.metrics_cache, pls.MetricsCache)
+            dfs = [
+                ls.compute_patch_metrics_df(),
+                ls.compute_class_metrics_df(),
+                ls.compute_landscape_metrics_df()
+            ]
+            self.assertGreater(len(ls.metrics_cache), 0)
+
+            # a landscape with the same content gets the results from the
+            # cache, so that it does not even need to label its patches
+            cached_ls = pls.Landscape(self.ls.landscape_arr.copy(),
+                                      res=(250, 250),
+                                      cache=pls.MetricsCache(cache_dir))
+            cached_dfs = [
+                cached_ls.compute_patch_metrics_df(),
+                cached_ls.compute_class_metrics_df(),
+                cached_ls.compute_landscape_metrics_df()
+            ]
+            self.assertFalse(hasattr(cached_ls, '_cached_label_arr'))
+            for df, cached_df in zip(dfs, cached_dfs):
+                pd.testing.assert_frame_equal(df, cached_df)
+
+            # but not a landscape with a different resolution nor different
+            # metric keyword arguments
+            other_ls = pls.Landscape(self.ls.landscape_arr, res=(100, 100),
+                                     cache=cache_dir)
+            self.assertNotEqual(other_ls._content_key, ls._content_key)
+            self.assertFalse(
+                np.allclose(
+                    ls.compute_class_metrics_df(
+                        metrics=['total_area'],
+                        metrics_kws={'total_area': {
+                            'hectares': False
+                        }}).values,
+                    dfs[1][['total_area']].values))
+
+            # nor the results stored by another version of pylandstats
+            version = pls.__version__
+            try:
+                pls.__version__ = version + '.dev0'
+                other_version_ls = pls.Landscape(self.ls.landscape_arr,
+                                                 res=(250, 250),
+                                                 cache=cache_dir)
+                self.assertNotEqual(other_version_ls._content_key,
+                                    ls._content_key)
+                with pls.MetricsProfiler() as profiler:
+                    other_version_ls.compute_class_metrics_df()
+                self.assertEqual(profiler.records_df['disk_hits'].sum(), 0)
+            finally:
+                pls.__version__ = version
+
+            # the least recently used results are evicted when the size limit
+            # is exceeded
+            cache = pls.MetricsCache(cache_dir, max_size=2**12)
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+            for i in range(8):
+                cache[str(i)] = np.zeros(2**6)
+                self.assertIn('0', cache)
+                # use the first result so that it is not evicted
+                cache['0']
+            self.assertLessEqual(cache.size, cache.max_size)
+            self.assertLess(len(cache), 8)
+            self.assertIn('7', cache)
+            self.assertRaises(KeyError, cache.__getitem__, '1')
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_metrics_profiler(self):
+        ls = pls.Landscape(self.ls.landscape_arr, res=(250, 250))
+        events = []
+        with pls.MetricsProfiler(callback=events.append) as profiler:
+            ls.compute_class_metrics_df(metrics=['total_area', 'area_mn'])
+            ls.compute_landscape_metrics_df(metrics=['total_edge'])
+        # calls outside the context are not recorded
+        ls.compute_landscape_metrics_df(metrics=['total_edge'])
+
+        records_df = profiler.records_df
+        self.assertEqual(records_df.index.names, ['kind', 'name'])
+        self.assertEqual(len(events), records_df['calls'].sum())
+        for kind, name in [('dataframe', 'compute_class_metrics_df'),
+                           ('dataframe', 'compute_landscape_metrics_df'),
+                           ('metric', 'total_edge')]:
+            self.assertEqual(records_df.loc[(kind, name), 'calls'], 1)
+        # the metric methods delegate to other metric methods and primitives,
+        # whose time is excluded from their self time
+        self.assertTrue(
+            (records_df['self_time'] <= records_df['time'] + 1e-9).all())
+        # the label array is computed only once and then reused
+        label_record = records_df.loc[('primitive', '_label_arr')]
+        self.assertEqual(label_record['misses'], 1)
+        self.assertEqual(label_record['hits'], label_record['calls'] - 1)
+
+        self.assertNotIn('peak_memory', records_df.columns)
+
+        # the memory is only recorded if requested
+        ls = pls.Landscape(self.ls.landscape_arr, res=(250, 250))
+        with pls.MetricsProfiler(memory=True) as profiler:
+            ls.compute_landscape_metrics_df(metrics=['area_mn'])
+        records_df = profiler.records_df
+        self.assertEqual(
+            records_df.loc[('primitive', '_label_arr'), 'cached_size'],
+            ls._label_arr.nbytes)
+        # the peak memory of a call includes the peak of its nested calls
+        self.assertGreaterEqual(
+            records_df.loc[('metric', 'area_mn'), 'peak_memory'],
+            records_df.loc[('primitive', '_label_arr'), 'peak_memory'])
+        self.assertGreaterEqual(
+            records_df.loc[('primitive', '_label_arr'), 'peak_memory'],
+            ls._label_arr.nbytes)
+
+        # the lookups of the on-disk cache are recorded as well
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for disk_hit in [False, True]:
+                with pls.MetricsProfiler() as profiler:
+                    pls.Landscape(
+                        self.ls.landscape_arr, res=(250, 250),
+                        cache=cache_dir).compute_landscape_metrics_df(
+                            metrics=['total_edge'])
+                record = profiler.records_df.loc[('metric', 'total_edge')]
+                self.assertEqual(record['disk_hits'], int(disk_hit))
+                self.assertEqual(record['disk_misses'], int(not disk_hit))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_cache_policy(self):
+        ls = pls.Landscape(self.ls.landscape_arr, res=(250, 250))
+        # only the cell counts are obtained upon initialization
+        self.assertEqual(set(ls.cache_sizes.index),
+                         {'landscape_area', '_class_num_cells_ser'})
+        class_metrics_df = ls.compute_class_metrics_df()
+        cache_sizes = ls.cache_sizes
+        self.assertIn('_label_arr', cache_sizes.index)
+        self.assertEqual(cache_sizes['_label_arr'], ls._label_arr.nbytes)
+        self.assertTrue((cache_sizes > 0).all())
+
+        # release the per-patch structures but keep the summaries
+        ls.clear_cache(keep_summaries=True)
+        self.assertNotIn('_label_arr', ls.cache_sizes.index)
+        self.assertIn('_class_summary_df', ls.cache_sizes.index)
+        # release everything (but the landscape area scalar)
+        ls.clear_cache()
+        self.assertLessEqual(set(ls.cache_sizes.index), {'landscape_area'})
+        # the structures are computed again when needed
+        pd.testing.assert_frame_equal(ls.compute_class_metrics_df(),
+                                      class_metrics_df)
+
+        for cache_policy, kept, released in [
+            ('all', ['_label_arr', '_class_summary_df'], []),
+            ('summaries', ['_class_summary_df'], ['_label_arr']),
+            ('none', [], ['_label_arr', '_class_summary_df']),
+        ]:
+            ls = pls.Landscape(self.ls.landscape_arr, res=(250, 250),
+                               cache_policy=cache_policy)
+            pd.testing.assert_frame_equal(ls.compute_class_metrics_df(),
+                                          class_metrics_df)
+            cached = ls.cache_sizes.index
+            for primitive in kept:
+                self.assertIn(primitive, cached)
+            for primitive in released:
+                self.assertNotIn(primitive, cached)
+
+        self.assertRaises(ValueError, pls.Landscape, self.ls.landscape_arr,
+                          res=(250, 250), cache_policy='foo')
+
+    def test_n_threads(self):
+        # the per-class primitives computed by several threads must be the
+        # same (and in the same order) as when computed sequentially
+        ls = pls.Landscape(self.ls.landscape_arr, res=(250, 250))
+        patch_df = ls.compute_patch_metrics_df()
+        class_df = ls.compute_class_metrics_df()
+        for n_threads in [2, -1]:
+            threaded_ls = pls.Landscape(self.ls.landscape_arr,
+                                        res=(250, 250), n_threads=n_threads)
+            self.assertTrue(
+                np.array_equal(threaded_ls._label_arr, ls._label_arr))
+            pd.testing.assert_frame_equal(
+                threaded_ls.compute_patch_metrics_df(), patch_df)
+            pd.testing.assert_frame_equal(
+                threaded_ls.compute_class_metrics_df(), class_df)
+
+    def test_label_arr(self):
+        ls = self.ls
+
+        # the landscape-wide label array must label each patch once, and the
+        # patches of each class must coincide with those obtained by labeling
+        # each class separately
+        label_arr = ls._label_arr
+        self.assertEqual(label_arr.max(), ls.number_of_patches())
+        for class_val in ls.classes:
+            class_label_arr, num_patches = ls.class_label(class_val)
+            self.assertEqual(ls._num_patches_dict[class_val], num_patches)
+            self.assertTrue(
+                np.all(ls._get_class_label_arr(class_val) == class_label_arr))
+
+    def test_patch_perimeters(self):
+        # the vectorized computation of the patch perimeters must match the
+        # perimeters of each patch computed separately, also for non-square
+        # cells
+        ls = pls.Landscape(self.ls.landscape_arr, res=(100, 50))
+        label_arr = ls._label_arr
+        patch_perimeters = ls.compute_patch_perimeters(label_arr)
+        self.assertEqual(len(patch_perimeters), label_arr.max())
+        for i, patch_slice in enumerate(ndimage.find_objects(label_arr),
+                                        start=1):
+            patch_arr = np.pad(label_arr[patch_slice] == i, pad_width=1,
+                               mode='constant', constant_values=False)
+            self.assertEqual(patch_perimeters[i - 1],
+                             ls.compute_arr_perimeter(patch_arr))
+
+    def test_patch_euclidean_nearest_neighbor(self):
+        # the nearest neighbor distances computed from the boundary cells
+        # only must match the distances computed from all the cells of each
+        # patch
+        ls = self.ls
+        enn_ser = ls._patch_euclidean_nearest_neighbor_ser
+        self.assertEqual(len(enn_ser), ls.number_of_patches())
+        for class_val in ls.classes:
+            label_arr, num_patches = ls.class_label(class_val)
+            class_enn = enn_ser[ls._patch_class_ser == class_val].values
+            if num_patches < 2:
+                self.assertTrue(np.all(np.isnan(class_enn)))
+                continue
+            I, J = np.nonzero(label_arr)
+            labels = label_arr[I, J]
+            coords = np.column_stack((I, J))
+            for i in range(1, num_patches + 1):
+                tree = spatial.cKDTree(coords[labels != i])
+                mindist, _ = tree.query(coords[labels == i])
+                self.assertAlmostEqual(class_enn[i - 1],
+                                       np.min(mindist) * ls.cell_width)
+
+    def test_adjacency_df(self):
+        ls = self.ls
+        adjacency_df = ls._adjacency_df
+
+        # one row for each class and one column for each class plus nodata
+        self.assertTrue(np.all(adjacency_df.index == ls.classes))
+        self.assertEqual(len(adjacency_df.columns), len(ls.classes) + 1)
+        # the adjacencies among classes are symmetric
+        class_adjacency_arr = adjacency_df[ls.classes].values
+        self.assertTrue(np.all(class_adjacency_arr == class_adjacency_arr.T))
+        # each side of each cell (including those at the landscape boundary)
+        # is counted once in the row of its class
+        for class_val in ls.classes:
+            self.assertEqual(adjacency_df.loc[class_val].sum(),
+                             4 * np.sum(ls.landscape_arr == class_val))
+
+    def test_nan_adjacency_df(self):
+        # the adjacencies with NaN cells are counted as adjacencies with
+        # nodata, so that the adjacency table and contagion are the same as
+        # if the NaN cells were nodata
+        nan_arr = self.ls.landscape_arr.astype(float)
+        nan_arr[np.random.RandomState(0).rand(*nan_arr.shape) < .1] = np.nan
+        nodata_ls = pls.Landscape(np.where(np.isnan(nan_arr), 0, nan_arr),
+                                  res=(250, 250), nodata=0)
+        for nodata in [0, np.nan]:
+            ls = pls.Landscape(nan_arr, res=(250, 250), nodata=nodata)
+            self.assertTrue(
+                np.all(ls._adjacency_df.values ==
+                       nodata_ls._adjacency_df.values))
+            for class_val in ls.classes:
+                self.assertEqual(ls._adjacency_df.loc[class_val].sum(),
+                                 4 * np.sum(nan_arr == class_val))
+            self.assertAlmostEqual(ls.contagion(), nodata_ls.contagion())
+
+    def test_nan_edges(self):
+        # NaN cells are treated as nodata, both for the landscape area and
+        # the edges, i.e., the metrics are the same as if they were nodata
+        ls_arr = self.ls.landscape_arr.astype(float)
+        nan_arr = np.copy(ls_arr)
+        nan_arr[np.random.RandomState(0).rand(*nan_arr.shape) < .1] = np.nan
+        nan_arr[:5] = np.nan
+        nodata_ls = pls.Landscape(np.where(np.isnan(nan_arr), 0, nan_arr),
+                                  res=(250, 250), nodata=0)
+        metrics = [
+            'total_area', 'proportion_of_landscape', 'total_edge',
+            'edge_density', 'landscape_shape_index'
+        ]
+        landscape_metrics = [
+            metric for metric in metrics if metric != 'proportion_of_landscape'
+        ]
+        nodata_class_df = nodata_ls.compute_class_metrics_df(metrics)
+        nodata_landscape_df = nodata_ls.compute_landscape_metrics_df(
+            landscape_metrics)
+        for nodata in [0, np.nan]:
+            ls = pls.Landscape(nan_arr, res=(250, 250), nodata=nodata)
+            self.assertEqual(ls.landscape_area, nodata_ls.landscape_area)
+            pd.testing.assert_frame_equal(
+                ls.compute_class_metrics_df(metrics), nodata_class_df)
+            pd.testing.assert_frame_equal(
+                ls.compute_landscape_metrics_df(landscape_metrics),
+                nodata_landscape_df)
+            for class_val in ls.classes:
+                self.assertEqual(
+                    ls.total_edge(class_val, count_boundary=True),
+                    nodata_ls.total_edge(class_val, count_boundary=True))
+                self.assertEqual(ls.total_edge(class_val),
+                                 ls.compute_arr_edge(nan_arr == class_val))
+
     def test_metrics_parameters(self):
         ls = self.ls
 
@@ -77,6 +448,70 @@ class TestLandscape(unittest.TestCase):
         self.assertEqual(len(landscape_df.index), 1)
         self.assertRaises(ValueError, ls.compute_landscape_metrics_df, ['foo'])
 
+        # the errors raised within the metrics are not mistaken for invalid
+        # metric names
+        def _raise_attribute_error(*args, **kwargs):
+            raise AttributeError
+
+        ls = pls.Landscape(ls.landscape_arr, res=(250, 250))
+        ls.total_edge = _raise_attribute_error
+        self.assertRaises(AttributeError, ls.compute_class_metrics_df,
+                          ['total_edge'])
+        self.assertRaises(AttributeError, ls.compute_landscape_metrics_df,
+                          ['total_edge'])
+
+    def test_class_metrics_df_vectorized(self):
+        ls = self.ls
+
+        # the metrics computed for all the classes at once must match the
+        # metrics computed for each class separately
+        class_df = ls.compute_class_metrics_df(
+            metrics_kws={'total_edge': {
+                'count_boundary': True
+            }})
+        for class_val in ls.classes:
+            for metric in pls.Landscape.CLASS_METRICS:
+                metric_kws = {
+                    'count_boundary': True
+                } if metric == 'total_edge' else {}
+                # ACHTUNG: euclidean nearest neighbor can be nan for classes
+                # with less than two patches
+                self.assertTrue(
+                    np.isclose(class_df.loc[class_val, metric],
+                               getattr(ls, metric)(class_val, **metric_kws),
+                               equal_nan=True))
+
+        # at the landscape level, each edge between two classes is shared by
+        # the total edge of both classes
+        self.assertAlmostEqual(
+            2 * ls.total_edge(),
+            np.sum([ls.total_edge(class_val) for class_val in ls.classes]))
+
+    def test_class_distribution_df(self):
+        ls = self.ls
+
+        # the grouped reductions must match the reductions of the patch-level
+        # metrics of each class
+        reduce_methods = {
+            'mn': np.mean,
+            'md': np.median,
+            'ra': lambda ser: ser.max() - ser.min(),
+            'sd': np.std,
+        }
+        for patch_metric in ['area', 'shape_index', 'fractal_dimension']:
+            class_distribution_df = ls._get_class_distribution_df(
+                getattr(ls, patch_metric), {})
+            for class_val in ls.classes:
+                patch_metric_ser = getattr(ls, patch_metric)(class_val)
+                for suffix, reduce_method in reduce_methods.items():
+                    self.assertAlmostEqual(
+                        class_distribution_df.loc[class_val, suffix],
+                        reduce_method(patch_metric_ser))
+                self.assertAlmostEqual(
+                    class_distribution_df.loc[class_val, 'am'],
+                    np.average(patch_metric_ser,
+                               weights=ls.area(class_val)))
+
     def test_landscape_metrics_value_ranges(self):
         ls = self.ls
 
@@ -203,6 +638,83 @@ class TestLandscape(unittest.TestCase):
         self.assertIsInstance(self.ls.plot_landscape(), plt.Axes)
 
 
+class TestTiledLandscape(unittest.TestCase):
+    def setUp(self):
+        self.landscape_fp = 'tests/input_data/ls250_06.tif'
+        self.ls = pls.Landscape(self.landscape_fp)
+
+    def test_tiled_init(self):
+        tls = pls.TiledLandscape(self.landscape_fp, tile_size=50)
+        self.assertTrue(np.all(tls.classes == self.ls.classes))
+        self.assertEqual(tls.landscape_area, self.ls.landscape_area)
+        self.assertTrue(np.all(tls.landscape_arr == self.ls.landscape_arr))
+
+    def test_tiled_metric_dataframes(self):
+        # the metrics computed by tiles must match the metrics computed over
+        # the whole landscape, regardless of the tile size (including tiles
+        # that do not evenly divide the raster and single-row tiles)
+        ls = self.ls
+        patch_df = ls.compute_patch_metrics_df()
+        class_df = ls.compute_class_metrics_df()
+        landscape_df = ls.compute_landscape_metrics_df()
+        for tile_size in [37, (1, 64), (123, 50), 1024]:
+            tls = pls.TiledLandscape(self.landscape_fp, tile_size=tile_size)
+            self.assertTrue(
+                np.allclose(tls.compute_patch_metrics_df(), patch_df,
+                            equal_nan=True))
+            self.assertTrue(
+                np.allclose(tls.compute_class_metrics_df(), class_df,
+                            equal_nan=True))
+            self.assertTrue(
+                np.allclose(tls.compute_landscape_metrics_df(), landscape_df,
+                            equal_nan=True))
+            self.assertTrue(np.all(tls._adjacency_df == ls._adjacency_df))
+
+
+class TestLazyLandscape(unittest.TestCase):
+    def setUp(self):
+        self.landscape_fp = 'tests/input_data/ls250_06.tif'
+        self.ls = pls.Landscape(self.landscape_fp)
+
+    def test_lazy_init(self):
+        # the raster is only read when needed
+        lls = pls.LazyLandscape(self.landscape_fp)
+        self.assertNotIn('_landscape_arr', vars(lls))
+        # getting the classes does not keep the raster in memory, regardless
+        # of the cache policy
+        for cache_policy in ['all', 'summaries']:
+            for copy in [True, False]:
+                lls = pls.LazyLandscape(self.landscape_fp, copy=copy,
+                                        cache_policy=cache_policy)
+                self.assertTrue(np.all(lls.classes == self.ls.classes))
+                self.assertNotIn('_landscape_arr', vars(lls))
+                pd.testing.assert_series_equal(lls._class_num_cells_ser,
+                                               self.ls._class_num_cells_ser)
+                self.assertEqual(lls.landscape_area, self.ls.landscape_area)
+        self.assertTrue(np.all(lls.landscape_arr == self.ls.landscape_arr))
+
+        # nor does the initialization of a multi-landscape analysis
+        sta = pls.SpatioTemporalAnalysis(
+            [self.landscape_fp, self.landscape_fp], dates=[0, 1])
+        for landscape in sta.landscapes:
+            self.assertNotIn('_landscape_arr', vars(landscape))
+
+    def test_lazy_metric_dataframes(self):
+        ls = self.ls
+        class_df = ls.compute_class_metrics_df()
+        landscape_df = ls.compute_landscape_metrics_df()
+        for cache_policy in ['all', 'summaries', 'none']:
+            lls = pls.LazyLandscape(self.landscape_fp,
+                                    cache_policy=cache_policy)
+            pd.testing.assert_frame_equal(lls.compute_class_metrics_df(),
+                                          class_df)
+            self.assertEqual(cache_policy == 'all', 'landscape_arr'
+                             in lls.cache_sizes.index)
+            # the raster is read again if needed
+            pd.testing.assert_frame_equal(lls.compute_landscape_metrics_df(),
+                                          landscape_df)
+
+
 class TestMultiLandscape(unittest.TestCase):
     def setUp(self):
         from pylandstats.multilandscape import MultiLandscape
@@ -300,6 +812,99 @@ class TestMultiLandscape(unittest.TestCase):
                 ml_metrics, pls.Landscape.LANDSCAPE_METRICS)))
         self.assertTrue(np.all(landscape_metrics_df.index == feature_values))
 
+        # the metrics are float columns
+        for metrics_df in [class_metrics_df, landscape_metrics_df]:
+            self.assertTrue(np.all(metrics_df.dtypes == np.float64))
+
+        # test the long-format data frames
+        for level, metrics_df in zip(['class', 'landscape'],
+                                     [class_metrics_df, landscape_metrics_df]):
+            tidy_df = ml.compute_tidy_metrics_df(level)
+            self.assertEqual(
+                list(tidy_df.columns),
+                list(metrics_df.index.names) + ['metric', 'value'])
+            self.assertEqual(len(tidy_df), metrics_df.size)
+            self.assertTrue(
+                np.allclose(
+                    tidy_df.set_index(
+                        list(metrics_df.index.names) +
+                        ['metric'])['value'].unstack('metric').loc[
+                            metrics_df.index, metrics_df.columns].values,
+                    metrics_df.values, equal_nan=True))
+        self.assertRaises(ValueError, ml.compute_tidy_metrics_df, 'patch')
+
+    def test_multilandscape_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            ml = self.InstantiableMultiLandscape(
+                self.landscape_fps, self.feature_name, self.feature_values,
+                cache=cache_dir)
+            class_metrics_df = ml.class_metrics_df
+            landscape_metrics_df = ml.landscape_metrics_df
+            # one entry for each landscape and level
+            self.assertEqual(len(ml.metrics_cache), 2 * len(ml))
+
+            # the metrics data frames of the landscapes are then read from the
+            # cache, both sequentially and in parallel
+            for n_jobs in [None, 2]:
+                cached_ml = self.InstantiableMultiLandscape(
+                    self.landscape_fps, self.feature_name,
+                    self.feature_values, n_jobs=n_jobs, cache=cache_dir)
+                pd.testing.assert_frame_equal(cached_ml.class_metrics_df,
+                                              class_metrics_df)
+                pd.testing.assert_frame_equal(cached_ml.landscape_metrics_df,
+                                              landscape_metrics_df)
+                for landscape in cached_ml.landscapes:
+                    self.assertFalse(hasattr(landscape, '_cached_label_arr'))
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_multilandscape_cache_policy(self):
+        ml = self.InstantiableMultiLandscape(self.landscape_fps,
+                                             self.feature_name,
+                                             self.feature_values)
+        # the per-patch structures of each landscape are released once its
+        # metrics data frame is computed
+        summaries_ml = self.InstantiableMultiLandscape(
+            self.landscape_fps, self.feature_name, self.feature_values,
+            cache_policy='summaries')
+        pd.testing.assert_frame_equal(summaries_ml.class_metrics_df,
+                                      ml.class_metrics_df)
+        for landscape, summaries_landscape in zip(ml.landscapes,
+                                                  summaries_ml.landscapes):
+            self.assertIn('_label_arr', landscape.cache_sizes.index)
+            self.assertNotIn('_label_arr',
+                             summaries_landscape.cache_sizes.index)
+            self.assertIn('_class_summary_df',
+                          summaries_landscape.cache_sizes.index)
+            # the landscapes are read from their paths, so their pixels are
+            # released as well
+            self.assertIn('landscape_arr', landscape.cache_sizes.index)
+            self.assertNotIn('landscape_arr',
+                             summaries_landscape.cache_sizes.index)
+
+        self.assertRaises(ValueError, self.InstantiableMultiLandscape,
+                          self.landscape_fps, self.feature_name,
+                          self.feature_values, cache_policy='foo')
+
+    def test_multilandscape_profiler(self):
+        # the records of the worker processes are merged into the profiler
+        records_dfs = []
+        for n_jobs in [None, 2]:
+            ml = self.InstantiableMultiLandscape(self.landscape_fps,
+                                                 self.feature_name,
+                                                 self.feature_values,
+                                                 n_jobs=n_jobs)
+            with pls.MetricsProfiler() as profiler:
+                ml.landscape_metrics_df
+            records_dfs.append(profiler.records_df)
+        for records_df in records_dfs:
+            self.assertEqual(
+                records_df.loc[('dataframe', 'compute_landscape_metrics_df'),
+                               'calls'], len(ml))
+        pd.testing.assert_series_equal(records_dfs[0]['calls'],
+                                       records_dfs[1]['calls'])
+
     def test_multilandscape_metric_kws(self):
         # Instantiate two multilandscape analyses, one with FRAGSTATS'
         # defaults and the other with keyword arguments specifying the total
@@ -456,6 +1061,21 @@ class TestSpatioTemporalAnalysis(unittest.TestCase):
         landscape_metrics_df = sta.landscape_metrics_df
         self.assertTrue(np.all(landscape_metrics_df.index == self.dates))
 
+    def test_spatiotemporalanalysis_n_jobs(self):
+        # the data frames computed in a pool of processes must be the same as
+        # those computed sequentially
+        sta = pls.SpatioTemporalAnalysis(self.landscape_fps, dates=self.dates)
+        parallel_sta = pls.SpatioTemporalAnalysis(self.landscape_fps,
+                                                  dates=self.dates, n_jobs=2)
+        for attr in ['class_metrics_df', 'landscape_metrics_df']:
+            df = getattr(sta, attr)
+            parallel_df = getattr(parallel_sta, attr)
+            self.assertTrue(np.all(parallel_df.index == df.index))
+            self.assertTrue(np.all(parallel_df.columns == df.columns))
+            self.assertTrue(
+                np.allclose(parallel_df.astype(float), df.astype(float),
+                            equal_nan=True))
+
     def test_spatiotemporalanalysis_plot_metrics(self):
         sta = pls.SpatioTemporalAnalysis(self.landscape_fps, dates=self.dates)
 
@@ -503,6 +1123,36 @@ class TestGradientAnalysis(unittest.TestCase):
 
         # from this point on, always instantiate from filepaths
 
+    def test_gradient_masked_landscapes(self):
+        # the landscapes of the analysis are cropped to the bounding box of
+        # each mask and only instantiated when accessed, but their metrics
+        # must be the same as those of the full-size masked landscapes
+        ga = pls.GradientAnalysis(self.landscape, self.masks_arr)
+        self.assertEqual(len(ga.landscapes._landscapes), 0)
+        masked_landscapes = [
+            pls.Landscape(
+                np.where(mask_arr, self.landscape.landscape_arr,
+                         self.landscape.nodata), res=(250, 250))
+            for mask_arr in self.masks_arr
+        ]
+        self.assertTrue(
+            np.all(ga.classes == np.unique(
+                np.concatenate([
+                    landscape.classes for landscape in masked_landscapes
+                ]))))
+        for landscape, masked_landscape in zip(ga.landscapes,
+                                               masked_landscapes):
+            self.assertLessEqual(landscape.landscape_arr.size,
+                                 masked_landscape.landscape_arr.size)
+            self.assertTrue(
+                np.allclose(landscape.compute_class_metrics_df(),
+                            masked_landscape.compute_class_metrics_df(),
+                            equal_nan=True))
+            self.assertTrue(
+                np.allclose(landscape.compute_landscape_metrics_df(),
+                            masked_landscape.compute_landscape_metrics_df(),
+                            equal_nan=True))
+
     def test_buffer_init(self):
         naive_gser = gpd.GeoSeries([self.geom])
         gser = gpd.GeoSeries([self.geom], crs=self.geom_crs)
@@ -596,6 +1246,150 @@ class TestGradientAnalysis(unittest.TestCase):
         for mask_arr, ring_mask_arr in zip(ba.masks_arr, ba_rings.masks_arr):
             self.assertGreaterEqual(np.sum(mask_arr), np.sum(ring_mask_arr))
 
+    def test_buffer_distance_masks(self):
+        # the buffer masks obtained as thresholds of a distance raster must
+        # only differ from the rasterized buffers at some of their boundary
+        # cells
+        for buffer_rings in [False, True]:
+            ba = pls.BufferAnalysis(self.landscape_fp, self.geom,
+                                    self.buffer_dists,
+                                    buffer_rings=buffer_rings,
+                                    base_mask_crs=self.geom_crs)
+            dist_ba = pls.BufferAnalysis(self.landscape_fp, self.geom,
+                                         self.buffer_dists,
+                                         buffer_rings=buffer_rings,
+                                         base_mask_crs=self.geom_crs,
+                                         rasterize_buffers=False)
+            self.assertEqual(dist_ba.buffer_dists, ba.buffer_dists)
+            self.assertEqual(len(dist_ba.masks_arr), len(ba.masks_arr))
+            for mask_arr, dist_mask_arr in zip(ba.masks_arr,
+                                               dist_ba.masks_arr):
+                self.assertEqual(dist_mask_arr.shape, mask_arr.shape)
+                self.assertLess(np.sum(dist_mask_arr != mask_arr),
+                                .02 * np.sum(mask_arr))
+            self.assertTrue(
+                np.all(dist_ba.landscape_metrics_df.index ==
+                       ba.landscape_metrics_df.index))
+
+        # the distance raster requires a projected landscape crs
+        self.assertRaises(ValueError, pls.BufferAnalysis, self.landscape,
+                          self.geom, self.buffer_dists,
+                          base_mask_crs=self.geom_crs,
+                          landscape_crs=self.geom_crs,
+                          landscape_transform=self.landscape_transform,
+                          rasterize_buffers=False)
+
+    def test_buffer_window(self):
+        # when the landscape is a raster file, only the window that covers
+        # the largest buffer is read, which must lead to the same metrics
+        # as the full landscape
+        landscape = pls.Landscape(self.landscape_fp)
+        metrics = ['proportion_of_landscape', 'number_of_patches',
+                   'total_edge']
+        for buffer_rings in [False, True]:
+            ba = pls.BufferAnalysis(self.landscape_fp, self.geom,
+                                    self.buffer_dists,
+                                    buffer_rings=buffer_rings,
+                                    base_mask_crs=self.geom_crs,
+                                    metrics=metrics)
+            full_ba = pls.BufferAnalysis(
+                landscape, self.geom, self.buffer_dists,
+                buffer_rings=buffer_rings, base_mask_crs=self.geom_crs,
+                landscape_crs=self.landscape_crs,
+                landscape_transform=self.landscape_transform, metrics=metrics)
+            self.assertIsNone(full_ba.landscape_window)
+            self.assertLessEqual(ba.masks_arr.shape[1],
+                                 landscape.landscape_arr.shape[0])
+            self.assertLessEqual(ba.masks_arr.shape[2],
+                                 landscape.landscape_arr.shape[1])
+            self.assertEqual(ba.masks_arr.shape[1:],
+                             (ba.landscape_window.height,
+                              ba.landscape_window.width))
+            self.assertEqual(
+                [np.sum(mask_arr) for mask_arr in ba.masks_arr],
+                [np.sum(mask_arr) for mask_arr in full_ba.masks_arr])
+            self.assertTrue(
+                np.allclose(ba.class_metrics_df.values.astype(float),
+                            full_ba.class_metrics_df.values.astype(float),
+                            equal_nan=True))
+
+    def test_multi_site_buffer_analysis(self):
+        sites = gpd.GeoSeries([
+            self.geom,
+            geometry.Point(6.7, 46.5),
+            geometry.Point(0, 0)
+        ], index=['a', 'b', 'c'], crs=self.geom_crs)
+        metrics = ['proportion_of_landscape', 'total_edge', 'edge_density']
+        for buffer_rings in [False, True]:
+            msba = pls.MultiSiteBufferAnalysis(self.landscape_fp, sites,
+                                               self.buffer_dists,
+                                               buffer_rings=buffer_rings,
+                                               group_size=16,
+                                               metrics=metrics)
+            self.assertEqual(len(msba), len(sites))
+            landscape_metrics_df = msba.landscape_metrics_df
+            class_metrics_df = msba.class_metrics_df
+            self.assertEqual(landscape_metrics_df.index.names,
+                             ['site', 'buffer_dists'])
+            self.assertEqual(class_metrics_df.index.names,
+                             ['class_val', 'site', 'buffer_dists'])
+            self.assertEqual(len(landscape_metrics_df),
+                             len(sites) * len(self.buffer_dists))
+            # the metrics of each site must be the same as those of the
+            # respective `BufferAnalysis`
+            for site in ['a', 'b']:
+                ba = pls.BufferAnalysis(self.landscape_fp, sites[site],
+                                        self.buffer_dists,
+                                        buffer_rings=buffer_rings,
+                                        base_mask_crs=self.geom_crs,
+                                        metrics=metrics)
+                self.assertEqual(
+                    list(landscape_metrics_df.loc[site].index),
+                    list(ba.buffer_dists))
+                self.assertTrue(
+                    np.allclose(
+                        landscape_metrics_df.loc[site].values.astype(float),
+                        ba.landscape_metrics_df.values.astype(float)))
+                site_class_metrics_df = class_metrics_df.xs(
+                    site, level='site').dropna(how='all')
+                ba_class_metrics_df = ba.class_metrics_df.dropna(how='all')
+                self.assertTrue(
+                    site_class_metrics_df.index.equals(
+                        ba_class_metrics_df.index))
+                self.assertTrue(
+                    np.allclose(site_class_metrics_df.values.astype(float),
+                                ba_class_metrics_df.values.astype(float)))
+            # the buffers of the last site do not intersect the landscape
+            self.assertTrue(landscape_metrics_df.loc['c'].isnull().all().all())
+            self.assertNotIn('c',
+                             class_metrics_df.index.get_level_values('site'))
+
+            # tidy data frames indexed by site and buffer distance (and class)
+            for level, metrics_df in [('landscape', landscape_metrics_df),
+                                      ('class', class_metrics_df)]:
+                tidy_df = msba.compute_tidy_metrics_df(level)
+                self.assertEqual(tidy_df.index.names[:2],
+                                 ['site', 'buffer_dists'])
+                self.assertEqual(list(tidy_df.columns), ['metric', 'value'])
+                self.assertEqual(len(tidy_df), metrics_df.size)
+                self.assertEqual(
+                    list(tidy_df.index.get_level_values('site').unique()),
+                    [
+                        site for site in sites.index
+                        if site in metrics_df.index.get_level_values('site')
+                    ])
+                sample_df = tidy_df.sample(10, random_state=0)
+                for index, row in sample_df.iterrows():
+                    if level == 'class':
+                        site, buffer_dist, class_val = index
+                        index = (class_val, site, buffer_dist)
+                    np.testing.assert_equal(
+                        row['value'], metrics_df.loc[index, row['metric']])
+            self.assertEqual(
+                msba.compute_tidy_metrics_df('class').index.names,
+                ['site', 'buffer_dists', 'class_val'])
+            self.assertRaises(ValueError, msba.compute_tidy_metrics_df, 'foo')
+
     def test_buffer_plot_metrics(self):
         ba = pls.BufferAnalysis(self.landscape_fp, self.geom,
                                 self.buffer_dists, base_mask_crs=self.geom_crs)
@@ -630,6 +1424,107 @@ class TestSpatioTemporalBufferAnalysis(unittest.TestCase):
         for sta in stba.stas:
             self.assertEqual(sta.dates, self.dates)
 
+    def test_spatiotemporalbufferanalysis_full_extent(self):
+        # although only the window of the largest buffer is read for the
+        # buffers, the inherited data frames must be computed over the full
+        # extent of the landscapes
+        metrics = ['total_area', 'proportion_of_landscape', 'edge_density']
+        stba = pls.SpatioTemporalBufferAnalysis(
+            self.landscape_fps, self.base_mask, self.buffer_dists,
+            dates=self.dates, metrics=metrics)
+        sta = pls.SpatioTemporalAnalysis(self.landscape_fps, dates=self.dates,
+                                         metrics=metrics)
+        # the full-extent analysis is only built when first required, i.e.,
+        # the buffer grid never builds it
+        for buffer_sta in stba.stas:
+            buffer_sta.landscape_metrics_df
+            buffer_sta.class_metrics_df
+        self.assertNotIn('_cached_full_extent_sta', vars(stba))
+        self.assertTrue(np.all(stba.classes == sta.classes))
+        self.assertEqual(len(stba), len(self.dates))
+        pd.testing.assert_frame_equal(stba.landscape_metrics_df,
+                                      sta.landscape_metrics_df)
+        pd.testing.assert_frame_equal(stba.class_metrics_df,
+                                      sta.class_metrics_df)
+
+    def test_spatiotemporalbufferanalysis_window_reads(self):
+        # the construction (and the buffer grid) only reads the window of
+        # the largest buffer of each raster, whereas the full rasters are
+        # only read if the full-extent data frames are required
+        read = DatasetReader.read
+        num_read_cells = []
+
+        def _counting_read(self, *args, **kwargs):
+            arr = read(self, *args, **kwargs)
+            num_read_cells.append(arr.size)
+            return arr
+
+        DatasetReader.read = _counting_read
+        try:
+            stba = pls.SpatioTemporalBufferAnalysis(
+                self.landscape_fps, self.base_mask, self.buffer_dists,
+                dates=self.dates, metrics=['total_area'])
+            window_num_cells = sum(
+                masked_landscapes._landscape.landscape_arr.size
+                for masked_landscapes in stba._dates_masked_landscapes)
+            self.assertEqual(sum(num_read_cells), window_num_cells)
+            for sta in stba.stas:
+                sta.landscape_metrics_df
+            self.assertEqual(sum(num_read_cells), window_num_cells)
+
+            del num_read_cells[:]
+            stba.landscape_metrics_df
+            self.assertGreaterEqual(
+                sum(num_read_cells),
+                sum(
+                    pls.Landscape(landscape_fp).landscape_arr.size
+                    for landscape_fp in self.landscape_fps))
+        finally:
+            DatasetReader.read = read
+
+    def test_spatiotemporalbufferanalysis_grid(self):
+        # the metrics of each date x buffer cell of the grid must be the same
+        # as those of the `BufferAnalysis` of the respective date, regardless
+        # of whether the grid is computed in parallel
+        metrics = ['proportion_of_landscape', 'edge_density']
+        for n_jobs in [None, 2]:
+            stba = pls.SpatioTemporalBufferAnalysis(
+                self.landscape_fps, self.base_mask, self.buffer_dists,
+                dates=self.dates, metrics=metrics, n_jobs=n_jobs)
+            for landscape_fp, date in zip(self.landscape_fps, self.dates):
+                ba = pls.BufferAnalysis(landscape_fp, self.base_mask,
+                                        self.buffer_dists, metrics=metrics)
+                for buffer_dist, sta in zip(ba.buffer_dists, stba.stas):
+                    self.assertTrue(
+                        np.allclose(
+                            sta.landscape_metrics_df.loc[date].astype(float),
+                            ba.landscape_metrics_df.loc[buffer_dist].astype(
+                                float)))
+                    self.assertTrue(
+                        np.allclose(
+                            sta.class_metrics_df.xs(
+                                date, level='dates').astype(float),
+                            ba.class_metrics_df.xs(
+                                buffer_dist,
+                                level='buffer_dists').loc[sta.classes].astype(
+                                    float), equal_nan=True))
+
+    def test_spatiotemporalbufferanalysis_grid_metrics_kws(self):
+        # the grid data frames computed with some keyword arguments must not
+        # be returned for others
+        stba = pls.SpatioTemporalBufferAnalysis(
+            self.landscape_fps, self.base_mask, self.buffer_dists,
+            dates=self.dates, metrics=['total_edge'])
+        sta = stba.stas[0]
+        total_edge_ser = sta.landscape_metrics_df['total_edge']
+        sta.metrics_kws = {'total_edge': {'count_boundary': True}}
+        del sta._landscape_metrics_df
+        boundary_total_edge_ser = sta.landscape_metrics_df['total_edge']
+        self.assertTrue(np.all(boundary_total_edge_ser > total_edge_ser))
+        for date, landscape in zip(self.dates, stba._dates_masked_landscapes):
+            self.assertEqual(boundary_total_edge_ser[date],
+                             landscape[0].total_edge(count_boundary=True))
+
     def test_spatiotemporalbufferanalysis_plot_metric(self):
         stba = pls.SpatioTemporalBufferAnalysis(
             self.landscape_fps, self.base_mask, self.buffer_dists)